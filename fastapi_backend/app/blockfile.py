@@ -0,0 +1,253 @@
+import mmap
+import struct
+from collections import OrderedDict
+from hashlib import sha256
+from pathlib import Path
+
+
+NETWORK_MAGIC = {
+    "main": bytes.fromhex("f9beb4d9"),
+    "test": bytes.fromhex("0b110907"),
+    "testnet4": bytes.fromhex("1c163f28"),
+    "signet": bytes.fromhex("0a03cf40"),
+    "regtest": bytes.fromhex("fabfb5da"),
+}
+
+HEADER_SIZE = 80
+NULL_HASH = bytes(32)
+# difficulty 1 target, difficulty is this over the block's target
+MAX_TARGET = 0xFFFF << 208
+# block files kept mapped for coinbase reads, mainnet has thousands and each holds a descriptor
+OPEN_FILES = 16
+
+
+def sha256d(data):
+    return sha256(sha256(data).digest()).digest()
+
+
+def bits_to_target(bits):
+    exponent, mantissa = bits >> 24, bits & 0x007FFFFF
+    if exponent <= 3:
+        return mantissa >> (8 * (3 - exponent))
+    return mantissa << (8 * (exponent - 3))
+
+
+def bits_to_difficulty(bits):
+    return MAX_TARGET / bits_to_target(bits)
+
+
+def bits_to_work(bits):
+    # expected hashes for a block at this target, the same GetBlockProof bitcoind sums into chainwork
+    return (1 << 256) // (bits_to_target(bits) + 1)
+
+
+def read_varint(buf, pos):
+    n = buf[pos]
+    if n < 0xFD:
+        return n, pos + 1
+    if n == 0xFD:
+        return struct.unpack_from("<H", buf, pos + 1)[0], pos + 3
+    if n == 0xFE:
+        return struct.unpack_from("<I", buf, pos + 1)[0], pos + 5
+    return struct.unpack_from("<Q", buf, pos + 1)[0], pos + 9
+
+
+def coinbase_output_sats(buf, pos):
+    # `pos` points at the block's tx count, right after the header; returns the coinbase's total output
+    _, pos = read_varint(buf, pos)
+    pos += 4  # version
+    if buf[pos] == 0:
+        # segwit marker + flag, a real input count is never zero
+        pos += 2
+    n_in, pos = read_varint(buf, pos)
+    for _ in range(n_in):
+        pos += 36  # prevout
+        script_len, pos = read_varint(buf, pos)
+        pos += script_len + 4  # script + sequence
+    n_out, pos = read_varint(buf, pos)
+    total = 0
+    for _ in range(n_out):
+        total += struct.unpack_from("<q", buf, pos)[0]
+        script_len, pos = read_varint(buf, pos + 8)
+        pos += script_len
+    if pos > len(buf):
+        raise IndexError("coinbase runs past the buffer")
+    return total
+
+
+def read_xor_key(blocks_dir):
+    # bitcoind >= 28 obfuscates block files with the 8 byte key in blocks/xor.dat
+    path = Path(blocks_dir) / "xor.dat"
+    if not path.exists():
+        return None
+    key = path.read_bytes()
+    return key if any(key) else None
+
+
+class BlockFile:
+    """
+    A memory-mapped `blk?????.dat`, records are `magic | size (u32 LE) | block`.
+
+    Unobfuscated files are read through memoryview slices of the map, so
+    parsing a header or coinbase copies nothing. With an XOR key only the
+    bytes actually parsed are de-obfuscated.
+    """
+
+    def __init__(self, path, xor_key=None, magic=NETWORK_MAGIC["main"]):
+        self.path = Path(path)
+        self._key = xor_key
+        self._magic = magic
+        self._file = open(self.path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+
+    def __len__(self):
+        return len(self._map)
+
+    def read(self, offset, size):
+        data = self._view[offset:offset + size]
+        if self._key is None:
+            return data
+        shift = offset % len(self._key)
+        key = (self._key * (len(data) // len(self._key) + 2))[shift:shift + len(data)]
+        return (int.from_bytes(data, "little") ^ int.from_bytes(key, "little")).to_bytes(len(data), "little")
+
+    def records(self):
+        # (offset, size) of every block in the file, the zero-filled preallocated tail ends the scan
+        pos = 0
+        while pos + 8 <= len(self):
+            prefix = self.read(pos, 8)
+            if prefix[:4] != self._magic:
+                break
+            size = struct.unpack_from("<I", prefix, 4)[0]
+            yield pos + 8, size
+            pos += 8 + size
+
+    def close(self):
+        self._view.release()
+        self._map.close()
+        self._file.close()
+
+
+class BlockIndex:
+    """
+    Header index of a node's `blocks/` directory, built by scanning blk*.dat.
+
+    bitcoind's own index in `blocks/index` is LevelDB, which would need
+    native bindings, so every record's 80 byte header is read instead and
+    linked by previous hash. The best chain is the branch with the most
+    work, stale blocks stored alongside it are ignored.
+    """
+
+    def __init__(self, blocks_dir, network="main", open_files=OPEN_FILES):
+        self.blocks_dir = Path(blocks_dir)
+        self._magic = NETWORK_MAGIC[network]
+        self._key = read_xor_key(blocks_dir)
+        # least recently used first, the oldest is closed once more than `open_files` are mapped
+        self._files = OrderedDict()
+        self._open_files = open_files
+        # raw block hash -> (file number, offset, size, header bytes)
+        self._headers = {}
+        self._chain = []
+
+    def _file(self, number):
+        if number in self._files:
+            self._files.move_to_end(number)
+            return self._files[number]
+        path = self.blocks_dir / f"blk{number:05d}.dat"
+        self._files[number] = blockfile = BlockFile(path, self._key, self._magic)
+        if len(self._files) > self._open_files:
+            self._files.popitem(last=False)[1].close()
+        return blockfile
+
+    def scan(self):
+        for path in sorted(self.blocks_dir.glob("blk*.dat")):
+            number = int(path.stem[3:])
+            # closed right after its headers are read, coinbase reads reopen through `_file`
+            blockfile = BlockFile(path, self._key, self._magic)
+            try:
+                for offset, size in blockfile.records():
+                    header = bytes(blockfile.read(offset, HEADER_SIZE))
+                    self._headers[sha256d(header)] = (number, offset, size, header)
+            finally:
+                blockfile.close()
+        self._chain = self._best_chain()
+        return self
+
+    def _best_chain(self):
+        children = {}
+        for blockhash, (_, _, _, header) in self._headers.items():
+            children.setdefault(header[4:36], []).append(blockhash)
+
+        # cumulative work from genesis, iteratively so deep chains don't hit the recursion limit
+        best, best_work = None, -1
+        stack = [(h, 0) for h in children.get(NULL_HASH, [])]
+        parent_of = {}
+        while stack:
+            blockhash, work = stack.pop()
+            header = self._headers[blockhash][3]
+            work += bits_to_work(struct.unpack_from("<I", header, 72)[0])
+            if work > best_work:
+                best, best_work = blockhash, work
+            for child in children.get(blockhash, []):
+                parent_of[child] = blockhash
+                stack.append((child, work))
+
+        chain = []
+        while best is not None:
+            chain.append(best)
+            best = parent_of.get(best)
+        chain.reverse()
+        return chain
+
+    @property
+    def tip_height(self):
+        return len(self._chain) - 1
+
+    def header(self, height):
+        # header fields of the best-chain block at `height`, in the shape getblockheader returns them
+        blockhash = self._chain[height]
+        header = self._headers[blockhash][3]
+        version, time, bits = (
+            struct.unpack_from("<i", header, 0)[0],
+            struct.unpack_from("<I", header, 68)[0],
+            struct.unpack_from("<I", header, 72)[0],
+        )
+        prev = header[4:36]
+        return {
+            "hash": blockhash[::-1].hex(),
+            "height": height,
+            "version": version,
+            "time": time,
+            "bits": f"{bits:08x}",
+            "difficulty": bits_to_difficulty(bits),
+            "previousblockhash": prev[::-1].hex() if prev != NULL_HASH else None,
+        }
+
+    def headers(self, start, stop):
+        # headers for [start, stop] with their chainwork, which needs every block from genesis
+        work = 0
+        for height in range(0, stop + 1):
+            header = self._headers[self._chain[height]][3]
+            work += bits_to_work(struct.unpack_from("<I", header, 72)[0])
+            if height >= start:
+                yield {**self.header(height), "chainwork": f"{work:064x}"}
+
+    def coinbase_sats(self, height):
+        number, offset, size, _ = self._headers[self._chain[height]]
+        blockfile = self._file(number)
+        # the coinbase is usually well under a few KB, only read further for unusual ones
+        length = 4096
+        while True:
+            buf = blockfile.read(offset, min(length, size))
+            try:
+                return coinbase_output_sats(buf, HEADER_SIZE)
+            except (IndexError, struct.error):
+                if length >= size:
+                    raise
+                length *= 4
+
+    def close(self):
+        for blockfile in self._files.values():
+            blockfile.close()
+        self._files.clear()
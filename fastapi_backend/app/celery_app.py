@@ -13,18 +13,35 @@ celery_app = Celery(
     backend=CELERY_RESULT_BACKEND,
 )
 
-# ensure only one task runs at a time…
+# the default worker runs one task at a time…
 celery_app.conf.update(
-    worker_concurrency=1,
+    worker_concurrency=settings.CELERY_WORKER_CONCURRENCY,
     worker_prefetch_multiplier=1,
     task_acks_late=True,
+    # price enrichment and revenue run on their own worker so provider
+    # rate limits never hold up block ingestion.
+    task_routes={
+        "app.tasks.enrich_prices": {"queue": "prices"},
+        "app.tasks.compute_revenue": {"queue": "prices"},
+        # backfill chunks are independent height ranges, any number of
+        # backfill workers/processes can consume them in parallel.
+        "app.tasks.backfill_chunk": {"queue": "backfill"},
+    },
 )
 
 celery_app.conf.beat_schedule = {
-    # runs every 10 minutes
+    # runs every 10 minutes, a safety net behind the block listener which triggers it on every new block
     "fetch-bitcoin-and-rate": {
         "task": "app.tasks.fetch_and_store_all",
         "schedule": 600.0,          # seconds
+        # runs still queued when the next one is due are dropped instead of piling up
+        "options": {"expires": 590.0},
+    },
+    # picks up blocks whose price lookup failed earlier
+    "enrich-prices": {
+        "task": "app.tasks.enrich_prices",
+        "schedule": 600.0,
+        "options": {"expires": 590.0},
     },
 }
 
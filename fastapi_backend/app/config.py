@@ -11,6 +11,16 @@ class Settings(BaseSettings):
     DATABASE_URL: str
     TEST_DATABASE_URL: str | None = None
     EXPIRE_ON_COMMIT: bool = False
+    # "null" (no pooling, serverless) or "queue" (connection pool, long-lived servers)
+    DB_POOL_MODE: str = "null"
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    # seconds before a pooled connection is replaced, pre-ping drops dead ones on checkout
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # Rows fetched per round trip by the server-side cursor of NDJSON and CSV responses.
+    STREAM_CHUNK_SIZE: int = 1000
 
     # User
     ACCESS_SECRET_KEY: str
@@ -23,11 +33,47 @@ class Settings(BaseSettings):
     BTC_NODE_RPC_URL: str
     BTC_NODE_USER: str
     BTC_NODE_PASS: str
+    # bitcoind -zmqpubhashblock endpoint, e.g. tcp://localhost:28332,
+    # without it the block listener long-polls waitfornewblock.
+    BTC_NODE_ZMQ_URL: str | None = None
+    BLOCK_POLL_TIMEOUT_MS: int = 60_000
+    # the node's blocks/ directory (read-only), for commands/backfill_blockfiles.py
+    BTC_BLOCKS_DIR: str | None = None
     START_BLOCK_HEIGHT: int
+    # Number of heights fetched ahead concurrently, 1 walks the chain serially.
+    INGEST_CONCURRENCY: int = 8
+    # Heights grouped into one JSON-RPC batch request, 1 disables batching.
+    RPC_BATCH_SIZE: int = 50
+    # How block fees are fetched: "blockstats", "verbose" (getblock verbosity 2) or "rawtx".
+    BLOCK_METRICS_SOURCE: str = "blockstats"
+    # Compute network hashrate from stored difficulty/chainwork instead of getnetworkhashps.
+    LOCAL_HASHRATE: bool = True
+    # Blocks priced per enrich_prices batch before revenue is computed for them.
+    PRICE_BATCH_SIZE: int = 500
+    # Blocks buffered by the writer before one multi-row insert + commit.
+    WRITE_BATCH_SIZE: int = 100
+    # Heights per transaction when mwh_revenue is recomputed for an asic.
+    RECOMPUTE_CHUNK_SIZE: int = 10_000
+    # Heights per backfill task, each chunk runs on whichever worker picks it up.
+    BACKFILL_CHUNK_SIZE: int = 2016
 
     # Celery
     CELERY_BROKER_URL: str
     CELERY_RESULT_BACKEND: str
+    # Processes per worker, the backfill worker overrides it on the command line.
+    CELERY_WORKER_CONCURRENCY: int = 1
+    # Lease (seconds) on the ingestion lock, renewed every third of it while a run is alive.
+    INGEST_LOCK_TTL: float = 60.0
+
+    # Price provider rate limit, shared by all workers through redis
+    RATE_LIMIT_REDIS_URL: str | None = None
+    PRICE_RATE_LIMIT_PER_MIN: float = 5
+    PRICE_RATE_LIMIT_BURST: int = 1
+
+    # Price provider HTTP client
+    PRICE_API_BASE_URL: str = "https://api.coingecko.com/api/v3"
+    PRICE_HTTP_TIMEOUT: float = 10.0
+    PRICE_HTTP_RETRIES: int = 3
     
     # Frontend
     FRONTEND_URL: str = "http://localhost:3000"
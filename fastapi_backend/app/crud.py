@@ -1,9 +1,66 @@
-from app.models import BlockData, ExchangeRate, MWHRevenue, ASIC
-from sqlalchemy import and_
+from app.models import BlockData, ExchangeRate, MWHRevenue, ASIC, IngestionCheckpoint
+from app.hashrate import HashrateWindow
+from app.utils import mwh_revenue
+from sqlalchemy import and_, func, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.future import select
-from datetime import timezone
+from datetime import datetime, timezone
 from uuid import UUID
 
+def dialect_insert(db, model):
+    # postgres and sqlite both support ON CONFLICT, but each through its own insert construct
+    if db.bind.dialect.name == "sqlite":
+        return sqlite_insert(model)
+    return pg_insert(model)
+
+
+def new_uuid(db):
+    # a fresh id per selected row, Python-side defaults don't run for INSERT ... SELECT.
+    # sqlite (the test database) stores UUIDs as 32 hex characters.
+    if db.bind.dialect.name == "sqlite":
+        return func.lower(func.hex(func.randomblob(16)))
+    return func.gen_random_uuid()
+
+
+def upsert(db, model, keys):
+    # INSERT ... ON CONFLICT (keys) DO UPDATE, replayed rows overwrite what is stored
+    stmt = dialect_insert(db, model)
+    columns = [
+        c.name for c in model.__table__.columns
+        if not c.primary_key and c.name not in keys
+    ]
+    return stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={name: stmt.excluded[name] for name in columns},
+    )
+
+
+async def get_checkpoint(db, stage, default=None):
+    result = await db.execute(
+        select(IngestionCheckpoint.height).where(IngestionCheckpoint.stage == stage)
+    )
+    height = result.scalars().first()
+    return default if height is None else height
+
+
+async def set_checkpoint(db, stage, height):
+    # not committed here, callers write it in the same transaction as the work it covers
+    await db.execute(
+        upsert(db, IngestionCheckpoint, ["stage"]),
+        {"stage": stage, "height": height, "updated_at": datetime.now(timezone.utc)},
+    )
+
+
+async def rewind_checkpoints(db, stages, height):
+    # blocks stored at or below a stage's checkpoint (e.g. by a backfill) must be picked up again
+    await db.execute(
+        update(IngestionCheckpoint)
+        .where(IngestionCheckpoint.stage.in_(stages), IngestionCheckpoint.height > height)
+        .values(height=height, updated_at=datetime.now(timezone.utc))
+    )
+
+
 async def fetch_block_data_with_exchange_rate(db, timestamp_start, timestamp_end):
     stmt = (
         select(BlockData, ExchangeRate)
@@ -25,25 +82,88 @@ async def fetch_block_data_with_exchange_rate(db, timestamp_start, timestamp_end
     return rows
 
 
-async def fetch_mwh_revenue(db, timestamp_start, timestamp_end, asic_id):
-    asic_id = UUID(asic_id)
-    asic = await db.execute(
-        select(ASIC)
+def mwh_revenue_query(timestamp_start, timestamp_end, asic_id):
+    return (
+        select(MWHRevenue)
         .where(
-            ASIC.id == asic_id
+            and_(
+                MWHRevenue.mwh_revenue_timestamp >= timestamp_start.replace(tzinfo=timezone.utc),
+                MWHRevenue.mwh_revenue_timestamp <= timestamp_end.replace(tzinfo=timezone.utc),
+                MWHRevenue.asic_id == UUID(asic_id)
+            )
         )
+        .order_by(MWHRevenue.block_number)
     )
-    asic = asic.scalars().first()
 
+
+async def fetch_mwh_revenue(db, timestamp_start, timestamp_end, asic_id):
+    result = await db.execute(mwh_revenue_query(timestamp_start, timestamp_end, asic_id))
+    return result.scalars().all()
+
+
+async def fetch_windowed_hash_rates(db, first_height, last_height, window):
+    """
+    Network hashrate averaged over the last `window` blocks for every height in
+    [first_height, last_height], built from the stored chainwork/time columns.
+
+    Chainwork is already a running total of work, so each point only needs the
+    difference of two entries plus the window's time spread, no node calls.
+    Heights whose window reaches rows without chainwork are left out.
+    """
     stmt = (
-        select(MWHRevenue)
+        select(BlockData.block_number, BlockData.block_timestamp, BlockData.chainwork)
         .where(
             and_(
-                MWHRevenue.mwh_revenue_timestamp >= timestamp_start.replace(tzinfo=timezone.utc),
-                MWHRevenue.mwh_revenue_timestamp <= timestamp_end.replace(tzinfo=timezone.utc),
-                MWHRevenue.asic_id == asic.id
+                BlockData.block_number >= first_height - window,
+                BlockData.block_number <= last_height,
+                BlockData.chainwork.is_not(None),
             )
         )
+        .order_by(BlockData.block_number)
     )
     result = await db.execute(stmt)
-    return result.scalars().all()
\ No newline at end of file
+
+    hashrate_window = HashrateWindow(window)
+    hash_rates = {}
+    for block_number, block_timestamp, chainwork in result.all():
+        hashrate_window.push(block_number, int(block_timestamp.timestamp()), chainwork)
+        hash_rate = hashrate_window.hashps()
+        if block_number >= first_height and hash_rate is not None:
+            hash_rates[block_number] = hash_rate
+    return hash_rates
+
+
+async def fetch_windowed_mwh_revenue(db, asic_id, block_numbers, window):
+    """
+    Recompute MWh revenue for `asic_id` at `block_numbers` using the network
+    hashrate averaged over `window` blocks. Returns {block_number: (hashrate, btc, usd)}.
+    """
+    if not block_numbers:
+        return {}
+    asic = await db.get(ASIC, UUID(str(asic_id)))
+    first, last = min(block_numbers), max(block_numbers)
+    hash_rates = await fetch_windowed_hash_rates(db, first, last, window)
+    wanted = hash_rates.keys() & set(block_numbers)
+
+    stmt = (
+        select(
+            BlockData.block_number,
+            BlockData.block_subsidy,
+            BlockData.block_transaction_fees,
+            ExchangeRate.exchange_rate,
+        )
+        .join(ExchangeRate, ExchangeRate.block_number == BlockData.block_number)
+        # a range rather than IN (...), which binds one parameter per block and
+        # runs past asyncpg's 32767 argument limit for ranges of a few months
+        .where(BlockData.block_number.between(first, last))
+    )
+    result = await db.execute(stmt)
+
+    revenue = {}
+    for block_number, subsidy, fees, exchange_rate in result.all():
+        if block_number not in wanted:
+            continue
+        hash_rate = hash_rates[block_number]
+        btc, usd = mwh_revenue(asic.asic_hash_rate, asic.asic_power, hash_rate, subsidy + fees, exchange_rate)
+        revenue[block_number] = (hash_rate, btc, usd)
+    return revenue
@@ -0,0 +1,76 @@
+import asyncio
+import logging
+
+from .config import settings
+from .hashrate import HashrateWindow
+from .listener import MAX_RETRY_DELAY, RETRY_DELAY, block_hashes
+from .locks import ingestion_lock
+from .rpc import HeaderCache
+from .tasks import _rpc_client, _session_maker, ingest_to_tip
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionDaemon:
+    """
+    Long-running block ingestion, the alternative to one Celery task per run.
+
+    The event loop, the pooled DB engine, the RPC session, the header cache
+    and the hashrate window live for the whole process, so a new block costs
+    only its own RPC calls and one write instead of a fresh engine, client
+    and window seed. Pricing and revenue stay on Celery.
+    """
+
+    def __init__(self, rpc, session_maker):
+        self._rpc = rpc
+        self._sessions = session_maker
+        self._headers = HeaderCache()
+        self._window = HashrateWindow()
+
+    async def _pass(self):
+        # a fresh session per pass, one left broken by a database failover isn't reused
+        async with self._sessions() as db:
+            return await ingest_to_tip(self._rpc, db, self._headers, self._window)
+
+    async def catch_up(self):
+        # keep going until a pass finds nothing new, blocks may arrive while one is running.
+        # RPC timeouts, node restarts and database failovers are retried with backoff
+        # instead of ending the process, the pass resumes from the blocks checkpoint.
+        delay = RETRY_DELAY
+        while True:
+            try:
+                if not await self._pass():
+                    return
+                delay = RETRY_DELAY
+            except Exception:
+                logger.exception("ingestion pass failed, retrying in %ss", delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY)
+
+    async def run(self, hashes):
+        await self.catch_up()
+        async for blockhash in hashes:
+            logger.info("new block %s", blockhash)
+            await self.catch_up()
+
+
+async def main():
+    lock = ingestion_lock()
+    try:
+        # the lease is held for the daemon's lifetime, beat runs of fetch_and_store_all skip meanwhile
+        while True:
+            async with lock.held() as acquired:
+                if acquired:
+                    async with _rpc_client() as rpc:
+                        hashes = block_hashes(rpc, settings.BTC_NODE_ZMQ_URL, settings.BLOCK_POLL_TIMEOUT_MS)
+                        await IngestionDaemon(rpc, _session_maker()).run(hashes)
+                    return
+            logger.info("ingestion lock is held elsewhere, retrying in %ss", settings.INGEST_LOCK_TTL)
+            await asyncio.sleep(settings.INGEST_LOCK_TTL)
+    finally:
+        await lock.aclose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -16,8 +16,24 @@ async_db_connection_url = (
     f"{parsed_db_url.path}"
 )
 
-# Disable connection pooling for serverless environments like Vercel
-engine = create_async_engine(async_db_connection_url, poolclass=NullPool)
+def pool_options(mode=None):
+    # "null" opens a connection per session (serverless, e.g. Vercel),
+    # "queue" keeps a pool of connections for long-lived servers.
+    mode = mode or settings.DB_POOL_MODE
+    if mode == "null":
+        return {"poolclass": NullPool}
+    if mode == "queue":
+        return {
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "pool_recycle": settings.DB_POOL_RECYCLE,
+            "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        }
+    raise ValueError(f"unknown DB_POOL_MODE {mode!r}, expected 'null' or 'queue'")
+
+
+engine = create_async_engine(async_db_connection_url, **pool_options())
 
 async_session_maker = async_sessionmaker(
     engine, expire_on_commit=settings.EXPIRE_ON_COMMIT
@@ -29,7 +45,24 @@ async def create_db_and_tables():
         await conn.run_sync(Base.metadata.create_all)
 
 
+def pool_stats():
+    pool = engine.pool
+    if isinstance(pool, NullPool):
+        return {"mode": "null"}
+    return {
+        "mode": "queue",
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+    }
+
+
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
         yield session
 
+
+def get_async_session_maker() -> async_sessionmaker:
+    # for streamed responses, which outlive get_async_session's session
+    return async_session_maker
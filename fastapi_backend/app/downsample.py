@@ -0,0 +1,68 @@
+from datetime import timezone
+
+import numpy as np
+
+
+def lttb(x, y, max_points):
+    """
+    Indices of at most `max_points` samples of the series (x, y) picked with
+    Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept. The points in between are
+    split into `max_points - 2` equal buckets, and each bucket keeps the point
+    forming the largest triangle with the point kept from the previous bucket
+    and the average of the next bucket, so spikes and dips survive where a
+    plain stride or average would flatten them. Bucket averages come from a
+    single `reduceat` and every bucket's triangle areas are one vector
+    expression, only the walk over the buckets is a Python loop, as each
+    pick depends on the previous one.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    # bucket i covers [edges[i], edges[i + 1]) of the points between the two ends
+    edges = np.linspace(1, n - 1, max_points - 1).astype(int)
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[:-1], edges[:-1]) / counts
+    mean_y = np.add.reduceat(y[:-1], edges[:-1]) / counts
+    # the point each bucket is compared against: the next bucket's average, the last point for the last bucket
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(max_points, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # twice the triangle area, the factor doesn't change the argmax
+        area = np.abs(
+            (x[a] - next_x[i]) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (next_y[i] - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def _epoch(timestamp):
+    return timestamp.replace(tzinfo=timezone.utc).timestamp()
+
+
+def downsample(rows, x, y, max_points):
+    # keep the LTTB subset of `rows` by their `x` timestamp and `y` value attributes, rows must be in `x` order
+    if max_points is None or len(rows) <= max_points:
+        return rows
+    xs = [_epoch(getattr(row, x)) for row in rows]
+    ys = [getattr(row, y) for row in rows]
+    return [rows[i] for i in lttb(xs, ys, max_points)]
+
+
+def downsample_columns(columns, x, y, max_points):
+    # the same for a {name: values} table
+    if max_points is None or len(columns[x]) <= max_points:
+        return columns
+    selected = lttb([_epoch(ts) for ts in columns[x]], columns[y], max_points)
+    return {name: [values[i] for i in selected] for name, values in columns.items()}
@@ -0,0 +1,83 @@
+from collections import deque
+
+
+DIFFICULTY_ADJUSTMENT_INTERVAL = 2016
+
+
+def lookup_for(height, nblocks=-1):
+    # Same lookback rules as bitcoind's getnetworkhashps: nblocks <= 0 means since the last difficulty change.
+    lookup = nblocks if nblocks > 0 else height % DIFFICULTY_ADJUSTMENT_INTERVAL + 1
+    return min(lookup, height)
+
+
+def chainwork_to_int(chainwork):
+    # bitcoind reports chainwork as a hex string
+    return int(chainwork, 16) if isinstance(chainwork, str) else int(chainwork)
+
+
+class HashrateWindow:
+    """
+    Sliding window of (height, time, chainwork) headers that reproduces
+    `getnetworkhashps(nblocks, height)` locally.
+
+    The node divides the work done between the first and last block of the
+    window by the spread between the minimum and maximum block time inside
+    it. Work comes from the chainwork difference in O(1), and the time spread
+    is kept with monotonic min/max deques, so every pushed block costs
+    amortized O(1) instead of a scan over the whole window.
+    """
+
+    def __init__(self, nblocks=-1):
+        self.nblocks = nblocks
+        self._headers = deque()
+        self._min = deque()
+        self._max = deque()
+
+    def __len__(self):
+        return len(self._headers)
+
+    @property
+    def tip(self):
+        return self._headers[-1][0] if self._headers else None
+
+    def clear(self):
+        self._headers.clear()
+        self._min.clear()
+        self._max.clear()
+
+    def push(self, height, time, chainwork):
+        # a gap means the window can't be trusted anymore, start over
+        if self._headers and height != self._headers[-1][0] + 1:
+            self.clear()
+
+        self._headers.append((height, time, chainwork_to_int(chainwork)))
+        while self._min and self._min[-1][1] >= time:
+            self._min.pop()
+        self._min.append((height, time))
+        while self._max and self._max[-1][1] <= time:
+            self._max.pop()
+        self._max.append((height, time))
+
+        # window start never moves backwards, so anything older can be dropped
+        start = height - lookup_for(height, self.nblocks)
+        while self._headers and self._headers[0][0] < start:
+            self._headers.popleft()
+        while self._min[0][0] < start:
+            self._min.popleft()
+        while self._max[0][0] < start:
+            self._max.popleft()
+
+    def hashps(self):
+        # hashrate at the tip, None while the window doesn't reach back far enough yet
+        if not self._headers:
+            return None
+        height, _, work = self._headers[-1]
+        start = height - lookup_for(height, self.nblocks)
+        first_height, _, first_work = self._headers[0]
+        if first_height != start:
+            return None
+
+        time_diff = self._max[0][1] - self._min[0][1]
+        if time_diff == 0:
+            return 0.0
+        return (work - first_work) / time_diff
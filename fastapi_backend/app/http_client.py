@@ -0,0 +1,37 @@
+from importlib.util import find_spec
+
+import httpx
+
+from .config import settings
+
+
+# HTTP/2 needs the optional `h2` package (httpx[http2]), fall back to HTTP/1.1 keep-alive without it.
+HTTP2_AVAILABLE = find_spec("h2") is not None
+
+PRICE_POOL_LIMITS = httpx.Limits(max_connections=10, max_keepalive_connections=5, keepalive_expiry=60)
+
+
+def make_price_client(**options):
+    """
+    Long-lived pooled client for the price provider.
+
+    One client is meant to be shared by a whole pipeline run so connections
+    (and their TLS sessions) are reused. Connection failures are retried by
+    the transport, throttling and server errors by the caller. Keyword
+    arguments override the defaults, e.g. `transport=` or `base_url=` to
+    point tests and benchmarks at a local stand-in server.
+    """
+    defaults = dict(
+        base_url=settings.PRICE_API_BASE_URL,
+        timeout=httpx.Timeout(settings.PRICE_HTTP_TIMEOUT, connect=5.0),
+        headers={"accept": "application/json"},
+    )
+    if "transport" not in options:
+        # built only when it's used, each transport opens its own connection pool.
+        # The client ignores its own http2/limits once a transport is given, they belong here
+        defaults["transport"] = httpx.AsyncHTTPTransport(
+            http2=HTTP2_AVAILABLE,
+            limits=PRICE_POOL_LIMITS,
+            retries=settings.PRICE_HTTP_RETRIES,
+        )
+    return httpx.AsyncClient(**{**defaults, **options})
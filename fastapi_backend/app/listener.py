@@ -0,0 +1,102 @@
+import asyncio
+import logging
+
+import zmq
+import zmq.asyncio
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# seconds between failed attempts, doubling up to the maximum while the node or broker is away
+RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 60.0
+
+HASHBLOCK_TOPIC = b"hashblock"
+
+
+async def zmq_block_hashes(endpoint, context=None):
+    """
+    Yield block hashes as bitcoind publishes them on `-zmqpubhashblock`.
+
+    Each notification is three frames: the topic, the 32 byte hash and a
+    little-endian sequence number. A jump in the sequence means messages
+    were dropped, the caller catches up from its checkpoint either way.
+    """
+    ctx = context or zmq.asyncio.Context.instance()
+    sock = ctx.socket(zmq.SUB)
+    sock.setsockopt(zmq.RCVHWM, 0)
+    sock.setsockopt(zmq.SUBSCRIBE, HASHBLOCK_TOPIC)
+    sock.connect(endpoint)
+    seq = None
+    try:
+        while True:
+            topic, body, *rest = await sock.recv_multipart()
+            if topic != HASHBLOCK_TOPIC:
+                continue
+            if rest:
+                n = int.from_bytes(rest[0], "little")
+                if seq is not None and n != seq + 1:
+                    logger.warning("missed %d hashblock notifications", n - seq - 1)
+                seq = n
+            yield body.hex()
+    finally:
+        sock.close(linger=0)
+
+
+async def longpoll_block_hashes(rpc, timeout_ms=60_000):
+    # waitfornewblock returns the tip once it changes, or the current tip when the timeout runs out.
+    # Node restarts, timeouts and auth errors are retried with backoff, a tip that moved
+    # meanwhile is still yielded as `last` survives the outage.
+    last = None
+    delay = RETRY_DELAY
+    while True:
+        try:
+            tip = await rpc.acall(
+                "waitfornewblock", [timeout_ms], timeout=timeout_ms / 1000 + 10
+            )
+        except Exception:
+            logger.exception("waitfornewblock failed, retrying in %ss", delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RETRY_DELAY)
+            continue
+        delay = RETRY_DELAY
+        if tip["hash"] != last:
+            if last is not None:
+                yield tip["hash"]
+            last = tip["hash"]
+
+
+def block_hashes(rpc, zmq_url=None, timeout_ms=60_000):
+    if zmq_url:
+        logger.info("listening for blocks on %s", zmq_url)
+        return zmq_block_hashes(zmq_url)
+    return longpoll_block_hashes(rpc, timeout_ms)
+
+
+async def listen(hashes, on_block):
+    async for blockhash in hashes:
+        logger.info("new block %s", blockhash)
+        try:
+            await on_block(blockhash)
+        except Exception:
+            # e.g. the broker is down, the next block or the beat run catches up from the checkpoint
+            logger.exception("handling block %s failed", blockhash)
+
+
+async def main():
+    from .tasks import _rpc_client, fetch_and_store_all
+
+    async def trigger(blockhash):
+        # the run resumes from the blocks checkpoint, so it only ingests what is new;
+        # the single-flight lock drops it if an earlier run is still going.
+        fetch_and_store_all.delay()
+
+    async with _rpc_client() as rpc:
+        hashes = block_hashes(rpc, settings.BTC_NODE_ZMQ_URL, settings.BLOCK_POLL_TIMEOUT_MS)
+        await listen(hashes, trigger)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from uuid import uuid4
+
+import redis.asyncio as redis
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Only the holder's token may extend or drop the lease.
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaseLock:
+    """
+    Single-flight lock kept in Redis as a key with a random token and a TTL.
+
+    While held, a heartbeat extends the lease every `ttl / 3` seconds. If the
+    worker dies the key simply expires, so a crashed run never blocks the
+    next one for longer than `ttl`. If a heartbeat finds the lease gone, or
+    can't reach redis before it runs out, the holder is cancelled rather than
+    left running next to a new owner.
+    """
+
+    def __init__(self, client, key, ttl=60.0):
+        self._client = client
+        self._key = key
+        self._ttl_ms = int(ttl * 1000)
+        self._token = uuid4().hex
+        self._renew = client.register_script(RENEW_SCRIPT)
+        self._release = client.register_script(RELEASE_SCRIPT)
+
+    async def acquire(self):
+        return bool(await self._client.set(self._key, self._token, nx=True, px=self._ttl_ms))
+
+    async def renew(self):
+        return bool(await self._renew(keys=[self._key], args=[self._token, self._ttl_ms]))
+
+    async def release(self):
+        await self._release(keys=[self._key], args=[self._token])
+
+    async def _heartbeat(self, owner):
+        loop = asyncio.get_running_loop()
+        interval = self._ttl_ms / 3000
+        # the lease runs out `ttl` after the last renewal that reached redis
+        deadline = loop.time() + self._ttl_ms / 1000
+        delay = interval
+        while True:
+            await asyncio.sleep(delay)
+            started = loop.time()
+            try:
+                # a hung connection counts as a failed renewal once the lease would be gone
+                renewed = await asyncio.wait_for(self.renew(), max(deadline - started, 0))
+            except Exception:
+                # redis unreachable or timing out, retry more often while the lease lasts
+                delay = interval / 3
+                if loop.time() + delay >= deadline:
+                    logger.exception("couldn't renew lease on %s before it ran out, stopping the holder", self._key)
+                    owner.cancel()
+                    return
+                logger.warning("renewing lease on %s failed, retrying", self._key, exc_info=True)
+                continue
+            if not renewed:
+                logger.warning("lost lease on %s, stopping the holder", self._key)
+                owner.cancel()
+                return
+            deadline = started + self._ttl_ms / 1000
+            delay = interval
+
+    @asynccontextmanager
+    async def held(self):
+        # yields False, without waiting, when another worker holds the lock
+        if not await self.acquire():
+            yield False
+            return
+        heartbeat = asyncio.ensure_future(self._heartbeat(asyncio.current_task()))
+        try:
+            yield True
+        finally:
+            heartbeat.cancel()
+            # let it finish cancelling, without raising what it ended with
+            await asyncio.wait([heartbeat])
+            await self.release()
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+class PendingFlag:
+    """
+    Redis flag that keeps at most one run of a task waiting in the queue.
+
+    Producers enqueue only when `set()` returns True, the task `clear()`s it
+    as it starts, so work written after that point queues a fresh run while
+    everything before it is covered by the running one. The flag expires
+    after `ttl`, which should match the enqueued task's `expires`, so a lost
+    or expired message never blocks later enqueues.
+    """
+
+    def __init__(self, client, key, ttl):
+        self._client = client
+        self._key = key
+        self._ttl_ms = int(ttl * 1000)
+
+    async def set(self):
+        return bool(await self._client.set(self._key, "1", nx=True, px=self._ttl_ms))
+
+    async def clear(self):
+        await self._client.delete(self._key)
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+def price_enrichment_flag(ttl):
+    client = redis.from_url(settings.CELERY_BROKER_URL, decode_responses=True)
+    return PendingFlag(client, "pending:enrich_prices", ttl)
+
+
+def ingestion_lock():
+    # lives on the broker's redis, which every worker already shares
+    client = redis.from_url(settings.CELERY_BROKER_URL, decode_responses=True)
+    return LeaseLock(client, "lock:ingestion", settings.INGEST_LOCK_TTL)
@@ -7,6 +7,7 @@ from app.routes.block_data import router as block_data_router
 from app.routes.exchange_rate import router as exchange_rate_router
 from app.routes.mwh_revenue import router as mwh_revenue_router
 from app.routes.asic import router as asic_router
+from app.routes.pool_stats import router as pool_stats_router
 from app.config import settings
 
 app = FastAPI(
@@ -36,4 +37,5 @@ app.add_middleware(
 app.include_router(block_data_router, prefix="/block_data")
 app.include_router(exchange_rate_router, prefix="/exchange_rate")
 app.include_router(mwh_revenue_router, prefix="/mwh_revenue")
-app.include_router(asic_router, prefix="/asic")
\ No newline at end of file
+app.include_router(asic_router, prefix="/asic")
+app.include_router(pool_stats_router, prefix="/pool_stats")
\ No newline at end of file
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy import Column, Integer, Float, DateTime, Index, String, ForeignKey
+from sqlalchemy import Column, Integer, Float, DateTime, Index, String, ForeignKey, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID
 from uuid import uuid4
 from sqlalchemy.orm import relationship
@@ -23,6 +23,11 @@ class BlockData(Base):
     block_subsidy = Column(Float, nullable=False)
     block_transaction_fees = Column(Float, nullable=False)
     network_hash_rate = Column(Float, nullable=False)
+    difficulty = Column(Float, nullable=True)
+    # hex string as reported by the node, too large for a bigint
+    chainwork = Column(String(64), nullable=True)
+    # lets ingestion check that each new block builds on the stored one below it
+    block_hash = Column(String(64), nullable=True)
 
 
 class ExchangeRate(Base):
@@ -56,6 +61,7 @@ class MWHRevenue(Base):
     # composite index on (mwh_revenue_timestamp, asic_id)
     __table_args__ = (
         Index("idx_mwh_revenue_timestamp_asic_id", "mwh_revenue_timestamp", "asic_id"),
+        UniqueConstraint("block_number", "asic_id", name="uq_mwh_revenue_block_asic"),
     )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
@@ -65,3 +71,104 @@ class MWHRevenue(Base):
     mwh_usd_revenue = Column(Float, nullable=False)
     mwh_revenue_timestamp = Column(DateTime(timezone=True), nullable=False)
     block_number = Column(Integer, index=True, nullable=False)
+
+
+class PricePoint(Base):
+    __tablename__ = "price_point"
+
+    # raw provider series, blocks look their price up here instead of calling the provider
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    price_timestamp = Column(DateTime(timezone=True), unique=True, index=True, nullable=False)
+    price_usd = Column(Float, nullable=False)
+
+
+class PriceRange(Base):
+    __tablename__ = "price_range"
+
+    # provider ranges already fetched, a block inside one without a nearby point has no price to find
+    __table_args__ = (
+        UniqueConstraint("range_start", "range_end", name="uq_price_range"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    range_start = Column(DateTime(timezone=True), nullable=False)
+    range_end = Column(DateTime(timezone=True), nullable=False)
+
+
+class BackfillChunk(Base):
+    __tablename__ = "backfill_chunk"
+
+    # one row per height range handed to a backfill worker
+    __table_args__ = (
+        UniqueConstraint("start_height", "end_height", name="uq_backfill_chunk_range"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    start_height = Column(Integer, nullable=False)
+    end_height = Column(Integer, nullable=False)
+    # last height committed by the chunk, a retried chunk resumes after it
+    last_height = Column(Integer, nullable=True)
+    status = Column(String, nullable=False, default="pending")
+    updated_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class IngestionCheckpoint(Base):
+    __tablename__ = "ingestion_checkpoint"
+
+    # highest height each stage (blocks, prices, revenue) has fully committed
+    stage = Column(String, primary_key=True)
+    height = Column(Integer, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class BlockDataRollup(Base):
+    __tablename__ = "block_data_rollup"
+
+    # one row per hour, day or difficulty epoch, refreshed as blocks are priced
+    __table_args__ = (
+        UniqueConstraint("resolution", "bucket", name="uq_block_data_rollup_bucket"),
+        Index("idx_block_data_rollup_resolution_start", "resolution", "bucket_start"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    resolution = Column(String, nullable=False)
+    # unix hour/day number or epoch number
+    bucket = Column(Integer, nullable=False)
+    # timestamps of the first and last block in the bucket
+    bucket_start = Column(DateTime(timezone=True), nullable=False)
+    bucket_end = Column(DateTime(timezone=True), nullable=False)
+    first_block = Column(Integer, nullable=False)
+    last_block = Column(Integer, nullable=False)
+    block_count = Column(Integer, nullable=False)
+    block_subsidy_sum = Column(Float, nullable=False)
+    block_transaction_fees_sum = Column(Float, nullable=False)
+    network_hash_rate_mean = Column(Float, nullable=False)
+    network_hash_rate_min = Column(Float, nullable=False)
+    network_hash_rate_max = Column(Float, nullable=False)
+
+
+class MWHRevenueRollup(Base):
+    __tablename__ = "mwh_revenue_rollup"
+
+    __table_args__ = (
+        UniqueConstraint("resolution", "asic_id", "bucket", name="uq_mwh_revenue_rollup_bucket"),
+        Index("idx_mwh_revenue_rollup_resolution_asic_start", "resolution", "asic_id", "bucket_start"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    resolution = Column(String, nullable=False)
+    asic_id = Column(UUID(as_uuid=True), ForeignKey("asic.id", ondelete="CASCADE"), nullable=False)
+    bucket = Column(Integer, nullable=False)
+    bucket_start = Column(DateTime(timezone=True), nullable=False)
+    bucket_end = Column(DateTime(timezone=True), nullable=False)
+    first_block = Column(Integer, nullable=False)
+    last_block = Column(Integer, nullable=False)
+    block_count = Column(Integer, nullable=False)
+    mwh_btc_revenue_sum = Column(Float, nullable=False)
+    mwh_btc_revenue_mean = Column(Float, nullable=False)
+    mwh_btc_revenue_min = Column(Float, nullable=False)
+    mwh_btc_revenue_max = Column(Float, nullable=False)
+    mwh_usd_revenue_sum = Column(Float, nullable=False)
+    mwh_usd_revenue_mean = Column(Float, nullable=False)
+    mwh_usd_revenue_min = Column(Float, nullable=False)
+    mwh_usd_revenue_max = Column(Float, nullable=False)
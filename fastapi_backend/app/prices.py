@@ -0,0 +1,217 @@
+import asyncio
+from bisect import bisect_left, insort
+from datetime import datetime, timezone
+
+from sqlalchemy import and_, select
+
+from .crud import dialect_insert
+from .http_client import make_price_client
+from .models import PricePoint, PriceRange
+
+
+PRICE_RANGE_PATH = "/coins/bitcoin/market_chart/range"
+# CG returns hourly points for ranges up to 90 days, keep each request just under that.
+FETCH_SPAN = 89 * 86400
+# the provider may still add points for the last hour, fetched coverage closer to now isn't recorded
+SETTLE_SECONDS = 3600
+
+
+def half_window_for(ts, now=None):
+    # CG has changing granularity the further back in time we go on public api,
+    # Choose a half-window (in seconds) to match CG granularity:
+    # 0–1 day   → 5 min intervals → ±300 s
+    # 1–90 days → hourly        → ±3 600 s (1 h)
+    # 90–365 days → daily       → ±86 400 s (1 d)
+    # >365 days  → use daily too (but data may be missing)
+    now = now or datetime.now(timezone.utc)
+    age_secs = (now - ts).total_seconds()
+    if age_secs <= 86400:
+        return 300
+    elif age_secs <= 90 * 86400:
+        return 3600
+    return 86400
+
+
+# Throttled (429) or failed (5xx) requests retried before giving up on a range.
+MAX_RETRIES = 5
+
+
+def retry_after_seconds(resp, default=60):
+    try:
+        return float(resp.headers.get("retry-after", default))
+    except ValueError:
+        # Retry-After may also be an HTTP date, fall back to the default pause
+        return default
+
+
+async def _get_range(client, url, limiter):
+    for attempt in range(MAX_RETRIES):
+        if limiter is not None:
+            await limiter.acquire()
+        resp = await client.get(url)
+        if resp.status_code == 429:
+            # pause every worker sharing the limiter, not only this one
+            if limiter is not None:
+                await limiter.block_for(retry_after_seconds(resp))
+            else:
+                await asyncio.sleep(retry_after_seconds(resp))
+        elif resp.status_code >= 500:
+            await asyncio.sleep(2 ** attempt)
+        else:
+            break
+    resp.raise_for_status()
+    return resp.json().get("prices", [])
+
+
+async def fetch_price_range(frm, to, limiter=None, client=None):
+    # returns [[ms, price], ...] for the unix second range [frm, to]
+    url = f"{PRICE_RANGE_PATH}?vs_currency=usd&from={frm}&to={to}"
+    if client is not None:
+        return await _get_range(client, url, limiter)
+    async with make_price_client() as client:
+        return await _get_range(client, url, limiter)
+
+
+class PriceSeries:
+    """USD price points kept sorted by time, lookups are a binary search."""
+
+    def __init__(self, points=()):
+        self._times = []
+        self._prices = {}
+        self.add(points)
+
+    def __len__(self):
+        return len(self._times)
+
+    def add(self, points):
+        # points are (unix seconds, price) pairs, duplicates keep the first price seen
+        for ts, price in points:
+            if ts not in self._prices:
+                self._prices[ts] = price
+                insort(self._times, ts)
+
+    def nearest(self, ts):
+        # closest (timestamp, price) to `ts`, or None when the series is empty
+        if not self._times:
+            return None
+        i = bisect_left(self._times, ts)
+        candidates = self._times[max(i - 1, 0):i + 1]
+        best = min(candidates, key=lambda t: abs(t - ts))
+        return best, self._prices[best]
+
+
+def _utc(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.utc)
+
+
+def _unix(timestamp):
+    return timestamp.replace(tzinfo=timezone.utc).timestamp()
+
+
+def merge_range(ranges, frm, to):
+    # sorted, non-overlapping (start, end) ranges with [frm, to] added
+    merged = []
+    for start, end in sorted([*ranges, (frm, to)]):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class PriceCache:
+    """
+    Resolves block prices from an in-memory `PriceSeries` backed by the
+    `price_point` table, going to CoinGecko only for time ranges neither has.
+
+    A miss fetches up to `FETCH_SPAN` seconds ahead of the requested time in
+    one request and persists every returned point, so a backfill needs about
+    one call per 89 days of blocks and re-runs never hit the network. The
+    fetched range itself is recorded in `price_range` too, so blocks in a
+    provider gap or in early history without data don't fetch it again.
+    """
+
+    def __init__(self, db=None, fetch=None, limiter=None, client=None):
+        self._db = db
+        self._fetch = fetch or (lambda frm, to: fetch_price_range(frm, to, limiter, client))
+        self._series = PriceSeries()
+        self._fetched = []
+
+    @property
+    def series(self):
+        return self._series
+
+    def _lookup(self, ts, half_window):
+        hit = self._series.nearest(ts)
+        if hit is not None and abs(hit[0] - ts) <= half_window:
+            return hit
+        return None
+
+    def _covered(self, frm, to):
+        return any(start <= frm and to <= end for start, end in self._fetched)
+
+    async def _load(self, frm, to):
+        result = await self._db.execute(
+            select(PricePoint.price_timestamp, PricePoint.price_usd)
+            .where(
+                and_(
+                    PricePoint.price_timestamp >= _utc(frm),
+                    PricePoint.price_timestamp <= _utc(to),
+                )
+            )
+        )
+        self._series.add((_unix(row.price_timestamp), row.price_usd) for row in result.all())
+        result = await self._db.execute(
+            select(PriceRange.range_start, PriceRange.range_end)
+            .where(and_(PriceRange.range_start <= _utc(to), PriceRange.range_end >= _utc(frm)))
+        )
+        for row in result.all():
+            self._fetched = merge_range(self._fetched, _unix(row.range_start), _unix(row.range_end))
+
+    async def _store_range(self, frm, to):
+        await self._db.execute(
+            dialect_insert(self._db, PriceRange)
+            .values(range_start=_utc(frm), range_end=_utc(to))
+            .on_conflict_do_nothing(index_elements=["range_start", "range_end"])
+        )
+
+    async def _store(self, points):
+        if not points:
+            return
+        await self._db.execute(
+            dialect_insert(self._db, PricePoint)
+            .values([
+                {"price_timestamp": _utc(ts), "price_usd": price}
+                for ts, price in points
+            ])
+            .on_conflict_do_nothing(index_elements=["price_timestamp"])
+        )
+
+    async def price_at(self, timestamp):
+        # returns (price, price_timestamp), or (None, None) if the provider has nothing close enough
+        ts = timestamp.timestamp()
+        now = datetime.now(timezone.utc)
+        half_window = half_window_for(timestamp, now)
+        frm = int(ts - half_window)
+        to = int(max(min(ts + FETCH_SPAN, now.timestamp()), ts + half_window))
+
+        hit = self._lookup(ts, half_window)
+        if hit is None and self._db is not None:
+            await self._load(frm, to)
+            hit = self._lookup(ts, half_window)
+        if hit is None and not self._covered(ts - half_window, ts + half_window):
+            points = [(ms / 1000, price) for ms, price in await self._fetch(frm, to)]
+            self._series.add(points)
+            settled = min(to, now.timestamp() - SETTLE_SECONDS)
+            if settled > frm:
+                self._fetched = merge_range(self._fetched, frm, settled)
+            if self._db is not None:
+                await self._store(points)
+                if settled > frm:
+                    await self._store_range(frm, settled)
+            hit = self._lookup(ts, half_window)
+        if hit is None:
+            return None, None
+
+        price_ts, price = hit
+        return price, _utc(price_ts)
@@ -0,0 +1,94 @@
+import asyncio
+
+import redis.asyncio as redis
+
+from .config import settings
+
+
+# Refill the bucket for the time elapsed since the last call and take one token.
+# Returns 0 when a token was taken, otherwise the milliseconds to wait before trying again.
+# Redis' own clock is used so every worker agrees on the time.
+ACQUIRE_SCRIPT = """
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+
+local blocked_until = tonumber(redis.call('GET', KEYS[2]) or '0')
+if blocked_until > now_ms then
+    return blocked_until - now_ms
+end
+
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now_ms
+tokens = math.min(capacity, tokens + (now_ms - ts) * rate)
+
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 - tokens) / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now_ms)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate) + 1000)
+return wait
+"""
+
+# Push the shared "blocked until" deadline forward, never backwards.
+BLOCK_SCRIPT = """
+local now = redis.call('TIME')
+local until_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000) + tonumber(ARGV[1])
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+if until_ms > current then
+    redis.call('SET', KEYS[1], until_ms, 'PX', ARGV[1])
+end
+return until_ms
+"""
+
+
+class TokenBucket:
+    """
+    Token bucket kept in Redis so every worker and process shares one quota.
+
+    `rate_per_min` tokens are added per minute up to `capacity`. `acquire`
+    waits until a token is free. `block_for` is called when the provider
+    answers 429 so all callers pause for its Retry-After, not just the one
+    that was throttled.
+    """
+
+    def __init__(self, client, key, rate_per_min, capacity=1):
+        self._client = client
+        self._key = key
+        self._blocked_key = f"{key}:blocked_until"
+        self._rate = rate_per_min / 60_000
+        self._capacity = capacity
+        self._acquire = client.register_script(ACQUIRE_SCRIPT)
+        self._block = client.register_script(BLOCK_SCRIPT)
+
+    async def acquire(self):
+        while True:
+            wait_ms = await self._acquire(
+                keys=[self._key, self._blocked_key],
+                args=[self._rate, self._capacity],
+            )
+            if wait_ms <= 0:
+                return
+            await asyncio.sleep(wait_ms / 1000)
+
+    async def block_for(self, seconds):
+        await self._block(keys=[self._blocked_key], args=[max(int(seconds * 1000), 1)])
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+def price_rate_limiter():
+    # shares the Celery broker's redis unless a dedicated one is configured
+    client = redis.from_url(settings.RATE_LIMIT_REDIS_URL or settings.CELERY_BROKER_URL)
+    return TokenBucket(
+        client,
+        "ratelimit:coingecko",
+        settings.PRICE_RATE_LIMIT_PER_MIN,
+        settings.PRICE_RATE_LIMIT_BURST,
+    )
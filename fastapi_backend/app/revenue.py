@@ -0,0 +1,138 @@
+import logging
+
+import numpy as np
+from sqlalchemy import bindparam, delete, func, select, true
+
+from .crud import dialect_insert, new_uuid
+from .models import ASIC, BlockData, ExchangeRate, MWHRevenue
+from .rollups import refresh_rollups
+from .utils import mwh_revenue
+
+logger = logging.getLogger(__name__)
+
+
+class RevenueEngine:
+    """
+    MWh revenue for a batch of blocks against the whole ASIC catalogue.
+
+    The catalogue is loaded once and kept as arrays, a batch of B blocks is
+    then a single broadcast of `mwh_revenue` over a (B, A) grid instead of a
+    Python loop per block and ASIC. Used by ingestion and recompute jobs.
+    """
+
+    def __init__(self, asics):
+        self.asic_ids = [asic.id for asic in asics]
+        self._hash_rate = np.array([asic.asic_hash_rate for asic in asics], dtype=float)
+        self._power = np.array([asic.asic_power for asic in asics], dtype=float)
+
+    @classmethod
+    async def load(cls, db):
+        result = await db.execute(select(ASIC))
+        return cls(result.scalars().all())
+
+    def __len__(self):
+        return len(self.asic_ids)
+
+    def compute(self, network_hash_rate, block_reward, price_usd):
+        # per-block inputs of shape (B,) → btc and usd revenue of shape (B, A)
+        network_hash_rate = np.asarray(network_hash_rate, dtype=float)[:, None]
+        block_reward = np.asarray(block_reward, dtype=float)[:, None]
+        price_usd = np.asarray(price_usd, dtype=float)[:, None]
+        return mwh_revenue(self._hash_rate, self._power, network_hash_rate, block_reward, price_usd)
+
+    def rows(self, blocks):
+        # MWHRevenue rows for block dicts with height, timestamp, subsidy, fees, hashrate and price_usd
+        if not blocks or not self.asic_ids:
+            return []
+        btc, usd = self.compute(
+            [b["hashrate"] for b in blocks],
+            [float(b["subsidy"]) + float(b["fees"]) for b in blocks],
+            [b["price_usd"] for b in blocks],
+        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("computed mwh revenue for %d blocks x %d asics", len(blocks), len(self))
+
+        btc, usd = btc.tolist(), usd.tolist()
+        return [
+            {
+                "block_number": block["height"],
+                "asic_id": asic_id,
+                "mwh_btc_revenue": btc[i][j],
+                "mwh_usd_revenue": usd[i][j],
+                "mwh_revenue_timestamp": block["timestamp"],
+            }
+            for i, block in enumerate(blocks)
+            for j, asic_id in enumerate(self.asic_ids)
+        ]
+
+
+def revenue_from_select(db, asic_id=None):
+    """
+    INSERT ... SELECT that writes MWh revenue for every priced block against
+    `asic_id` (or all ASICs) using the same share-of-hashrate formula, evaluated
+    by the database. Bind `lo` and `hi` to restrict the block range. Rows that
+    already exist, e.g. written by the revenue stage meanwhile, are updated.
+    """
+    fleet_hash_rate = ASIC.asic_hash_rate * (1_000_000 / ASIC.asic_power)
+    share_of_hashrate = fleet_hash_rate / (BlockData.network_hash_rate + fleet_hash_rate)
+    btc = (BlockData.block_subsidy + BlockData.block_transaction_fees) * share_of_hashrate
+
+    source = (
+        select(
+            new_uuid(db),
+            ASIC.id,
+            btc,
+            btc * ExchangeRate.exchange_rate,
+            BlockData.block_timestamp,
+            BlockData.block_number,
+        )
+        .select_from(BlockData)
+        .join(ExchangeRate, ExchangeRate.block_number == BlockData.block_number)
+        .join(ASIC, true())
+        .where(BlockData.block_number.between(bindparam("lo"), bindparam("hi")))
+    )
+    if asic_id is not None:
+        source = source.where(ASIC.id == asic_id)
+
+    # on the Core table, an ORM insert would take the bound `lo`/`hi` for rows to bulk insert
+    stmt = dialect_insert(db, MWHRevenue.__table__)
+    return stmt.from_select(
+        ["id", "asic_id", "mwh_btc_revenue", "mwh_usd_revenue", "mwh_revenue_timestamp", "block_number"],
+        source,
+    ).on_conflict_do_update(
+        index_elements=["block_number", "asic_id"],
+        set_={name: stmt.excluded[name] for name in ("mwh_btc_revenue", "mwh_usd_revenue", "mwh_revenue_timestamp")},
+    )
+
+
+async def recompute_revenue(db, asic_id=None, chunk_size=10_000):
+    """
+    Fill or refresh mwh_revenue for one ASIC (or all) over the full history.
+
+    Each chunk of heights is replaced in its own transaction with a DELETE and
+    a set-based INSERT ... SELECT over block_data JOIN exchange_rate, so no
+    block is walked in Python and a re-run simply rewrites the same rows. The
+    DELETE drops rows of blocks that lost their price, the fill is an upsert
+    so revenue written by `compute_revenue` between the two doesn't collide.
+    Returns the number of rows written.
+    """
+    bounds = await db.execute(select(func.min(BlockData.block_number), func.max(BlockData.block_number)))
+    first, last = bounds.one()
+    if first is None:
+        return 0
+
+    stale = delete(MWHRevenue).where(MWHRevenue.block_number.between(bindparam("lo"), bindparam("hi")))
+    if asic_id is not None:
+        stale = stale.where(MWHRevenue.asic_id == asic_id)
+    fill = revenue_from_select(db, asic_id)
+
+    written = 0
+    for lo in range(first, last + 1, chunk_size):
+        hi = min(lo + chunk_size - 1, last)
+        await db.execute(stale, {"lo": lo, "hi": hi})
+        result = await db.execute(fill, {"lo": lo, "hi": hi})
+        await refresh_rollups(db, lo, hi)
+        await db.commit()
+        written += result.rowcount
+        logger.info("recomputed mwh revenue for blocks %d-%d", lo, hi)
+    return written
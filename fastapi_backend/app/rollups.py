@@ -0,0 +1,162 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import Integer, and_, cast, delete, extract, func, literal, literal_column, select
+
+from .crud import dialect_insert, new_uuid
+from .hashrate import DIFFICULTY_ADJUSTMENT_INTERVAL
+from .models import BlockData, BlockDataRollup, MWHRevenue, MWHRevenueRollup
+
+
+# bucket width in seconds, epochs are counted in blocks instead
+RESOLUTIONS = {"hour": 3600, "day": 86400, "epoch": None}
+
+
+def bucket_of(resolution, block_number, timestamp):
+    if resolution == "epoch":
+        return block_number // DIFFICULTY_ADJUSTMENT_INTERVAL
+    return int(timestamp.replace(tzinfo=timezone.utc).timestamp()) // RESOLUTIONS[resolution]
+
+
+def _bucket_filter(resolution, first, last):
+    # every block in the buckets that `first` and `last` (block_number, timestamp) fall in
+    lo, hi = bucket_of(resolution, *first), bucket_of(resolution, *last)
+    if resolution == "epoch":
+        return BlockData.block_number.between(
+            lo * DIFFICULTY_ADJUSTMENT_INTERVAL, (hi + 1) * DIFFICULTY_ADJUSTMENT_INTERVAL - 1
+        )
+    size = RESOLUTIONS[resolution]
+    return and_(
+        BlockData.block_timestamp >= datetime.fromtimestamp(lo * size, tz=timezone.utc),
+        BlockData.block_timestamp < datetime.fromtimestamp((hi + 1) * size, tz=timezone.utc),
+    )
+
+
+def bucket_expr(db, resolution):
+    # `bucket_of` evaluated by the database for every block_data row. The sizes are inlined,
+    # as bound parameters postgres wouldn't match the SELECT expression to the GROUP BY one
+    if resolution == "epoch":
+        return BlockData.block_number // literal_column(str(DIFFICULTY_ADJUSTMENT_INTERVAL), Integer)
+    size = literal_column(str(RESOLUTIONS[resolution]), Integer)
+    if db.bind.dialect.name == "sqlite":
+        return cast(func.strftime("%s", BlockData.block_timestamp), Integer) // size
+    return cast(func.floor(extract("epoch", BlockData.block_timestamp) / size), Integer)
+
+
+def _upsert_from_select(db, model, keys, values, where, group_by):
+    # INSERT ... SELECT of the {column: expression} `values` with a fresh id, a bucket that exists is overwritten
+    source = select(new_uuid(db), *values.values()).where(where).group_by(*group_by)
+    # on the Core table, like `revenue_from_select`
+    stmt = dialect_insert(db, model.__table__)
+    return stmt.from_select(["id", *values], source).on_conflict_do_update(
+        index_elements=keys,
+        set_={name: stmt.excluded[name] for name in values if name not in keys},
+    )
+
+
+def block_rollups(db, resolution, in_buckets):
+    bucket = bucket_expr(db, resolution)
+    values = {
+        "resolution": literal(resolution),
+        "bucket": bucket,
+        "bucket_start": func.min(BlockData.block_timestamp),
+        "bucket_end": func.max(BlockData.block_timestamp),
+        "first_block": func.min(BlockData.block_number),
+        "last_block": func.max(BlockData.block_number),
+        "block_count": func.count(),
+        "block_subsidy_sum": func.sum(BlockData.block_subsidy),
+        "block_transaction_fees_sum": func.sum(BlockData.block_transaction_fees),
+        "network_hash_rate_mean": func.avg(BlockData.network_hash_rate),
+        "network_hash_rate_min": func.min(BlockData.network_hash_rate),
+        "network_hash_rate_max": func.max(BlockData.network_hash_rate),
+    }
+    return _upsert_from_select(db, BlockDataRollup, ["resolution", "bucket"], values, in_buckets, [bucket])
+
+
+def revenue_rollups(db, resolution, in_buckets):
+    bucket = bucket_expr(db, resolution)
+    values = {
+        "resolution": literal(resolution),
+        "asic_id": MWHRevenue.asic_id,
+        "bucket": bucket,
+        "bucket_start": func.min(BlockData.block_timestamp),
+        "bucket_end": func.max(BlockData.block_timestamp),
+        "first_block": func.min(MWHRevenue.block_number),
+        "last_block": func.max(MWHRevenue.block_number),
+        "block_count": func.count(),
+    }
+    for currency in ("btc", "usd"):
+        revenue = getattr(MWHRevenue, f"mwh_{currency}_revenue")
+        values.update({
+            f"mwh_{currency}_revenue_sum": func.sum(revenue),
+            f"mwh_{currency}_revenue_mean": func.avg(revenue),
+            f"mwh_{currency}_revenue_min": func.min(revenue),
+            f"mwh_{currency}_revenue_max": func.max(revenue),
+        })
+    # revenue rows joined to their block, for its time and bucket
+    in_buckets = and_(BlockData.block_number == MWHRevenue.block_number, in_buckets)
+    return _upsert_from_select(
+        db, MWHRevenueRollup, ["resolution", "asic_id", "bucket"], values, in_buckets, [bucket, MWHRevenue.asic_id],
+    )
+
+
+async def refresh_rollups(db, first_height, last_height):
+    """
+    Rebuild every hour, day and epoch bucket that blocks `first_height`..`last_height`
+    fall in, from block_data and mwh_revenue.
+
+    Only the touched buckets are re-aggregated, each resolution with one
+    INSERT ... SELECT ... GROUP BY per table, so no block or revenue row is
+    read into Python and refreshing the same range twice gives the same
+    rows. The touched buckets are deleted first, a bucket whose blocks have
+    all lost their revenue doesn't linger. Not committed here, callers
+    commit with the writes that triggered it.
+    """
+    # block times aren't monotonic, a block in the middle of the range can sit in an
+    # hour or day outside the ones of the range's end heights, so span the extremes
+    bounds = await db.execute(
+        select(
+            func.min(BlockData.block_number),
+            func.max(BlockData.block_number),
+            func.min(BlockData.block_timestamp),
+            func.max(BlockData.block_timestamp),
+        )
+        .where(BlockData.block_number.between(first_height, last_height))
+    )
+    first_block, last_block, first_time, last_time = bounds.one()
+    if first_block is None:
+        return
+    first, last = (first_block, first_time), (last_block, last_time)
+
+    for resolution in RESOLUTIONS:
+        lo, hi = bucket_of(resolution, *first), bucket_of(resolution, *last)
+        for model in (MWHRevenueRollup, BlockDataRollup):
+            await db.execute(
+                delete(model).where(model.resolution == resolution, model.bucket.between(lo, hi))
+            )
+        in_buckets = _bucket_filter(resolution, first, last)
+        await db.execute(block_rollups(db, resolution, in_buckets))
+        await db.execute(revenue_rollups(db, resolution, in_buckets))
+
+
+async def delete_rollups_above(db, height):
+    # buckets reaching past `height` are rebuilt when their blocks are written again
+    for model in (MWHRevenueRollup, BlockDataRollup):
+        await db.execute(delete(model).where(model.last_block > height))
+
+
+def rollups_query(model, resolution, timestamp_start, timestamp_end, *where):
+    return (
+        select(model)
+        .where(
+            model.resolution == resolution,
+            model.bucket_end >= timestamp_start.replace(tzinfo=timezone.utc),
+            model.bucket_start <= timestamp_end.replace(tzinfo=timezone.utc),
+            *where,
+        )
+        .order_by(model.bucket_start)
+    )
+
+
+async def fetch_rollups(db, model, resolution, timestamp_start, timestamp_end, *where):
+    result = await db.execute(rollups_query(model, resolution, timestamp_start, timestamp_end, *where))
+    return result.scalars().all()
@@ -1,29 +1,76 @@
 from datetime import datetime, timezone
+from typing import Literal
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.future import select
 
-from app.database import get_async_session
-from app.models import BlockData
+from app.crud import fetch_windowed_hash_rates
+from app.columnar import columnar_response
+from app.database import get_async_session, get_async_session_maker
+from app.downsample import downsample
+from app.models import BlockData, BlockDataRollup
+from app.rollups import fetch_rollups, rollups_query
 from app.schemas import BlockData as BlockDataSchema
+from app.schemas import BlockDataRollup as BlockDataRollupSchema
+from app.streaming import STREAM_RESPONSES, reject_unstreamable, stream_format, stream_response
 
 router = APIRouter(tags=["block_data"])
 
 
-@router.get("/", response_model=list[BlockDataSchema])
+@router.get("/", response_model=list[BlockDataSchema] | list[BlockDataRollupSchema], responses=STREAM_RESPONSES)
 async def read_block_data(
     block_timestamp_start: datetime,
     block_timestamp_end: datetime,
+    hashrate_window: int | None = Query(None, ge=1, description="Average network hashrate over this many blocks (144 ≈ 1 day, 2016 = 1 epoch)"),
+    resolution: Literal["hour", "day", "epoch"] | None = Query(None, description="Return hourly, daily or difficulty epoch aggregates instead of one row per block"),
+    max_points: int | None = Query(None, ge=3, description="Downsample to at most this many rows with LTTB on the network hashrate, keeping its peaks and troughs"),
+    columnar: bool = Query(False, description="Return {column: [values]} built from the raw rows instead of a list of objects"),
+    accept: str | None = Header(None, description="application/x-ndjson, text/csv or application/vnd.apache.arrow.stream streams the rows instead of returning one JSON array"),
     db: AsyncSession = Depends(get_async_session),
+    session_maker: async_sessionmaker = Depends(get_async_session_maker),
 ):
-    
-    result = await db.execute(
+    media_type = stream_format(accept)
+    reject_unstreamable(media_type, hashrate_window=hashrate_window, max_points=max_points)
+    if columnar and hashrate_window is not None:
+        raise HTTPException(status_code=400, detail="hashrate_window can't be combined with columnar")
+
+    if resolution is not None:
+        if hashrate_window is not None:
+            raise HTTPException(status_code=400, detail="hashrate_window can't be combined with resolution")
+        stmt = rollups_query(BlockDataRollup, resolution, block_timestamp_start, block_timestamp_end)
+        if media_type is not None:
+            return stream_response(session_maker, stmt, BlockDataRollup, media_type, f"block_data_{resolution}")
+        if columnar:
+            return await columnar_response(db, stmt, BlockDataRollup, "bucket_start", "network_hash_rate_mean", max_points)
+        rollups = await fetch_rollups(db, BlockDataRollup, resolution, block_timestamp_start, block_timestamp_end)
+        rollups = downsample(rollups, "bucket_start", "network_hash_rate_mean", max_points)
+        return [BlockDataRollupSchema.model_validate(rollup) for rollup in rollups]
+
+    stmt = (
         select(BlockData).filter(
             BlockData.block_timestamp >= block_timestamp_start.replace(tzinfo=timezone.utc),
             BlockData.block_timestamp <= block_timestamp_end.replace(tzinfo=timezone.utc),
         )
+        .order_by(BlockData.block_number)
     )
-    blocks = result.scalars().all()
-    return [BlockDataSchema.model_validate(block) for block in blocks]
+    if media_type is not None:
+        return stream_response(session_maker, stmt, BlockData, media_type, "block_data")
+    if columnar:
+        return await columnar_response(db, stmt, BlockData, "block_timestamp", "network_hash_rate", max_points)
+
+    result = await db.execute(stmt)
+    # downsampled before windowing, so only the rows returned get a window computed
+    blocks = downsample(result.scalars().all(), "block_timestamp", "network_hash_rate", max_points)
+    if hashrate_window is None or not blocks:
+        return [BlockDataSchema.model_validate(block) for block in blocks]
+
+    block_numbers = [block.block_number for block in blocks]
+    hash_rates = await fetch_windowed_hash_rates(db, min(block_numbers), max(block_numbers), hashrate_window)
+    return [
+        BlockDataSchema.model_validate(block).model_copy(
+            update={"window_hash_rate": hash_rates.get(block.block_number)}
+        )
+        for block in blocks
+    ]
 
@@ -1,28 +1,41 @@
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.future import select
 
-from app.database import get_async_session
+from app.columnar import columnar_response
+from app.database import get_async_session, get_async_session_maker
 from app.models import ExchangeRate
 from app.schemas import ExchangeRate as ExchangeRateSchema
+from app.streaming import STREAM_RESPONSES, stream_format, stream_response
 
 router = APIRouter(tags=["exchange_rate"])
 
 
-@router.get("/", response_model=list[ExchangeRateSchema])
+@router.get("/", response_model=list[ExchangeRateSchema], responses=STREAM_RESPONSES)
 async def read_exchange_rate(
     exchange_rate_timestamp_start: datetime,
     exchange_rate_timestamp_end: datetime,
+    columnar: bool = Query(False, description="Return {column: [values]} built from the raw rows instead of a list of objects"),
+    accept: str | None = Header(None, description="application/x-ndjson, text/csv or application/vnd.apache.arrow.stream streams the rows instead of returning one JSON array"),
     db: AsyncSession = Depends(get_async_session),
+    session_maker: async_sessionmaker = Depends(get_async_session_maker),
 ):
-    result = await db.execute(
+    stmt = (
         select(ExchangeRate).filter(
             ExchangeRate.exchange_rate_timestamp >= exchange_rate_timestamp_start.replace(tzinfo=timezone.utc),
             ExchangeRate.exchange_rate_timestamp <= exchange_rate_timestamp_end.replace(tzinfo=timezone.utc),
         )
+        .order_by(ExchangeRate.block_number)
     )
+    media_type = stream_format(accept)
+    if media_type is not None:
+        return stream_response(session_maker, stmt, ExchangeRate, media_type, "exchange_rate")
+    if columnar:
+        return await columnar_response(db, stmt, ExchangeRate)
+
+    result = await db.execute(stmt)
     exchange_rates = result.scalars().all()
     return [ExchangeRateSchema.model_validate(exchange_rate) for exchange_rate in exchange_rates]
 
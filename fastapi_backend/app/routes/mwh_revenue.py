@@ -1,26 +1,83 @@
 from datetime import datetime
+from typing import Literal
+from uuid import UUID
 
-from fastapi import APIRouter, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from app.database import get_async_session
+from app.columnar import columnar_response
+from app.database import get_async_session, get_async_session_maker
+from app.downsample import downsample
+from app.models import MWHRevenue as MWHRevenueModel
+from app.models import MWHRevenueRollup
+from app.rollups import fetch_rollups, rollups_query
 from app.schemas import MWHRevenue
-from app.crud import fetch_mwh_revenue
+from app.schemas import MWHRevenueRollup as MWHRevenueRollupSchema
+from app.streaming import STREAM_RESPONSES, reject_unstreamable, stream_format, stream_response
+from app.crud import fetch_mwh_revenue, fetch_windowed_mwh_revenue, mwh_revenue_query
 
 router = APIRouter(tags=["mwh_revenue"])
 
 
-@router.get("/", response_model=list[MWHRevenue])
+@router.get("/", response_model=list[MWHRevenue] | list[MWHRevenueRollupSchema], responses=STREAM_RESPONSES)
 async def get_mwh_revenue(
     timestamp_start: datetime,
     timestamp_end: datetime,
     asic_id: str,
+    hashrate_window: int | None = Query(None, ge=1, description="Recompute revenue with the network hashrate averaged over this many blocks"),
+    resolution: Literal["hour", "day", "epoch"] | None = Query(None, description="Return hourly, daily or difficulty epoch aggregates instead of one row per block"),
+    max_points: int | None = Query(None, ge=3, description="Downsample to at most this many rows with LTTB on the USD revenue, keeping its peaks and troughs"),
+    columnar: bool = Query(False, description="Return {column: [values]} built from the raw rows instead of a list of objects"),
+    accept: str | None = Header(None, description="application/x-ndjson, text/csv or application/vnd.apache.arrow.stream streams the rows instead of returning one JSON array"),
     db: AsyncSession = Depends(get_async_session),
+    session_maker: async_sessionmaker = Depends(get_async_session_maker),
 ):
+    media_type = stream_format(accept)
+    reject_unstreamable(media_type, hashrate_window=hashrate_window, max_points=max_points)
+    if columnar and hashrate_window is not None:
+        raise HTTPException(status_code=400, detail="hashrate_window can't be combined with columnar")
+
+    if resolution is not None:
+        if hashrate_window is not None:
+            raise HTTPException(status_code=400, detail="hashrate_window can't be combined with resolution")
+        where = MWHRevenueRollup.asic_id == UUID(asic_id)
+        stmt = rollups_query(MWHRevenueRollup, resolution, timestamp_start, timestamp_end, where)
+        if media_type is not None:
+            return stream_response(session_maker, stmt, MWHRevenueRollup, media_type, f"mwh_revenue_{resolution}")
+        if columnar:
+            return await columnar_response(db, stmt, MWHRevenueRollup, "bucket_start", "mwh_usd_revenue_mean", max_points)
+        rollups = await fetch_rollups(db, MWHRevenueRollup, resolution, timestamp_start, timestamp_end, where)
+        rollups = downsample(rollups, "bucket_start", "mwh_usd_revenue_mean", max_points)
+        return [MWHRevenueRollupSchema.model_validate(rollup) for rollup in rollups]
+
+    stmt = mwh_revenue_query(timestamp_start, timestamp_end, asic_id)
+    if media_type is not None:
+        return stream_response(session_maker, stmt, MWHRevenueModel, media_type, "mwh_revenue")
+    if columnar:
+        return await columnar_response(db, stmt, MWHRevenueModel, "mwh_revenue_timestamp", "mwh_usd_revenue", max_points)
+
     mwh_revenue = await fetch_mwh_revenue(
         db,
         timestamp_start,
         timestamp_end,
         asic_id
     )
-    return [MWHRevenue.model_validate(p) for p in mwh_revenue]
+    mwh_revenue = downsample(mwh_revenue, "mwh_revenue_timestamp", "mwh_usd_revenue", max_points)
+    if hashrate_window is None:
+        return [MWHRevenue.model_validate(p) for p in mwh_revenue]
+
+    windowed = await fetch_windowed_mwh_revenue(
+        db,
+        asic_id,
+        [p.block_number for p in mwh_revenue],
+        hashrate_window
+    )
+    return [
+        MWHRevenue.model_validate(p).model_copy(
+            update=dict(zip(
+                ("window_hash_rate", "window_mwh_btc_revenue", "window_mwh_usd_revenue"),
+                windowed.get(p.block_number, (None, None, None)),
+            ))
+        )
+        for p in mwh_revenue
+    ]
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+
+from app.database import pool_stats
+from app.schemas import PoolStats
+
+router = APIRouter(tags=["pool_stats"])
+
+
+@router.get("/", response_model=PoolStats)
+async def read_pool_stats():
+    return PoolStats(**pool_stats())
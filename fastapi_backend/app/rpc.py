@@ -0,0 +1,138 @@
+import asyncio
+from collections import OrderedDict
+
+import orjson
+from bitcoinrpc import RPCError
+
+
+class BatchRPC:
+    """
+    Wraps a `BitcoinRPC` client and sends several calls as one JSON-RPC batch.
+
+    bitcoind accepts an array of request objects in a single POST and answers
+    with an array of responses, so a whole window of blocks can be fetched
+    with one HTTP round trip per call type.
+    """
+
+    def __init__(self, rpc, timeout=30.0):
+        self._rpc = rpc
+        self._timeout = timeout
+
+    @property
+    def rpc(self):
+        return self._rpc
+
+    async def batch(self, calls):
+        # calls is a list of (method, params) tuples, results keep the same order.
+        if not calls:
+            return []
+
+        payload = [
+            {"jsonrpc": "2.0", "id": i, "method": method, "params": params}
+            for i, (method, params) in enumerate(calls)
+        ]
+        response = await self._rpc.client.post(
+            url=self._rpc.url,
+            content=orjson.dumps(payload),
+            timeout=self._timeout,
+        )
+        # Response may be empty, due to for example failed authentication.
+        if response.content == b"":
+            response.raise_for_status()
+
+        # bitcoind may answer batch entries in any order, match them back by id.
+        by_id = {entry["id"]: entry for entry in orjson.loads(response.content)}
+        results = []
+        for i in range(len(calls)):
+            entry = by_id[i]
+            if entry.get("error") is not None:
+                raise RPCError(id=i, error=entry["error"])
+            results.append(entry["result"])
+        return results
+
+    async def getblockhashes(self, heights):
+        return await self.batch([("getblockhash", [h]) for h in heights])
+
+    async def getblocks(self, hashes, verbosity=1):
+        return await self.batch([("getblock", [h, verbosity]) for h in hashes])
+
+
+HEADER_FIELDS = (
+    "hash",
+    "height",
+    "time",
+    "mediantime",
+    "bits",
+    "difficulty",
+    "chainwork",
+    "previousblockhash",
+)
+
+
+class HeaderCache:
+    """
+    Bounded LRU cache of recently seen block headers, keyed by hash and height.
+
+    Only header fields are kept so a few thousand entries stay small. Block
+    fetches that are still in flight can be registered with `track`, lookups
+    for that height then wait for the running fetch instead of issuing a
+    second `getblock`.
+    """
+
+    def __init__(self, maxsize=4096):
+        self._maxsize = maxsize
+        self._by_hash = OrderedDict()
+        self._by_height = {}
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._by_hash)
+
+    def clear(self):
+        self._by_hash.clear()
+        self._by_height.clear()
+
+    def put(self, blk):
+        header = {k: blk[k] for k in HEADER_FIELDS if k in blk}
+        self._by_hash[header["hash"]] = header
+        self._by_hash.move_to_end(header["hash"])
+        self._by_height[header["height"]] = header["hash"]
+
+        while len(self._by_hash) > self._maxsize:
+            _, evicted = self._by_hash.popitem(last=False)
+            if self._by_height.get(evicted["height"]) == evicted["hash"]:
+                del self._by_height[evicted["height"]]
+        return header
+
+    def get(self, key):
+        # int keys are heights, anything else is a block hash.
+        if isinstance(key, int):
+            key = self._by_height.get(key)
+        header = self._by_hash.get(key)
+        if header is not None:
+            self._by_hash.move_to_end(key)
+        return header
+
+    async def track(self, height, fetch):
+        # register an in-flight fetch of the block at `height` and cache its header.
+        task = asyncio.ensure_future(fetch)
+        self._pending[height] = task
+        try:
+            blk = await task
+        finally:
+            self._pending.pop(height, None)
+        self.put(blk)
+        return blk
+
+    async def get_or_fetch(self, blockhash, height, fetch):
+        header = self.get(blockhash)
+        if header is not None:
+            return header
+
+        pending = self._pending.get(height)
+        if pending is not None:
+            blk = await asyncio.shield(pending)
+            if blk["hash"] == blockhash:
+                return self.put(blk)
+
+        return self.put(await fetch())
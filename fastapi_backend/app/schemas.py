@@ -10,6 +10,11 @@ class BlockData(BaseModel):
     block_subsidy: float
     block_transaction_fees: float
     network_hash_rate: float
+    difficulty: float | None = None
+    chainwork: str | None = None
+    block_hash: str | None = None
+    # only set when a hashrate_window is requested
+    window_hash_rate: float | None = None
 
     model_config = ConfigDict(frozen=True, from_attributes=True)
 
@@ -40,5 +45,56 @@ class MWHRevenue(BaseModel):
     mwh_usd_revenue: float
     mwh_revenue_timestamp: datetime
     block_number: int
+    # only set when a hashrate_window is requested
+    window_hash_rate: float | None = None
+    window_mwh_btc_revenue: float | None = None
+    window_mwh_usd_revenue: float | None = None
 
     model_config = ConfigDict(frozen=True, from_attributes=True)
+
+
+class BlockDataRollup(BaseModel):
+    resolution: str
+    # timestamps of the first and last block in the bucket
+    bucket_start: datetime
+    bucket_end: datetime
+    first_block: int
+    last_block: int
+    block_count: int
+    block_subsidy_sum: float
+    block_transaction_fees_sum: float
+    network_hash_rate_mean: float
+    network_hash_rate_min: float
+    network_hash_rate_max: float
+
+    model_config = ConfigDict(frozen=True, from_attributes=True)
+
+
+class MWHRevenueRollup(BaseModel):
+    resolution: str
+    asic_id: UUID
+    bucket_start: datetime
+    bucket_end: datetime
+    first_block: int
+    last_block: int
+    block_count: int
+    mwh_btc_revenue_sum: float
+    mwh_btc_revenue_mean: float
+    mwh_btc_revenue_min: float
+    mwh_btc_revenue_max: float
+    mwh_usd_revenue_sum: float
+    mwh_usd_revenue_mean: float
+    mwh_usd_revenue_min: float
+    mwh_usd_revenue_max: float
+
+    model_config = ConfigDict(frozen=True, from_attributes=True)
+
+class PoolStats(BaseModel):
+    mode: str
+    # connection counts, only reported for the queue pool
+    size: int | None = None
+    checked_in: int | None = None
+    checked_out: int | None = None
+    overflow: int | None = None
+
+    model_config = ConfigDict(frozen=True)
@@ -0,0 +1,117 @@
+import csv
+import io
+from datetime import datetime
+
+import orjson
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from .columnar import ARROW, ArrowStreamEncoder, table_query
+from .config import settings
+
+
+NDJSON = "application/x-ndjson"
+CSV = "text/csv"
+STREAM_CHUNK_SIZE = settings.STREAM_CHUNK_SIZE
+# documents the streamed formats next to the JSON response in the OpenAPI schema
+STREAM_RESPONSES = {200: {"content": {NDJSON: {}, CSV: {}, ARROW: {}}}}
+
+
+# media ranges the regular JSON response satisfies
+JSON_RANGES = ("application/json", "application/*", "*/*")
+
+
+def _quality(params):
+    for param in params:
+        name, _, value = param.partition("=")
+        if name.strip() == "q":
+            try:
+                return float(value)
+            except ValueError:
+                break
+    return 1.0
+
+
+def stream_format(accept):
+    # the streamed media type the Accept header prefers, None for the regular JSON response.
+    # Ranges are ranked by q, ties in header order, and q=0 means "not acceptable".
+    ranked = []
+    for media_range in (accept or "").split(","):
+        media_type, *params = media_range.strip().lower().split(";")
+        q = _quality(params)
+        if q > 0:
+            ranked.append((q, media_type.strip()))
+    ranked.sort(key=lambda r: -r[0])
+    for _, media_type in ranked:
+        if media_type in (NDJSON, CSV, ARROW):
+            return media_type
+        if media_type in JSON_RANGES:
+            return None
+    return None
+
+
+def reject_unstreamable(media_type, **params):
+    # options that need every row in memory at once can't be combined with a stream
+    used = [name for name, value in params.items() if value is not None]
+    if media_type is not None and used:
+        raise HTTPException(status_code=400, detail=f"{', '.join(used)} can't be combined with {media_type}")
+
+
+def _cell(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _ndjson(columns, objs):
+    return b"".join(
+        orjson.dumps({c: getattr(obj, c) for c in columns}, option=orjson.OPT_APPEND_NEWLINE) for obj in objs
+    )
+
+
+def _csv_lines(rows):
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    return buf.getvalue().encode()
+
+
+def _csv(columns, objs):
+    return _csv_lines([_cell(getattr(obj, c)) for c in columns] for obj in objs)
+
+
+async def stream_rows(session_maker, stmt, model, media_type, chunk_size=None):
+    """
+    Yield the rows of `stmt` (a select of `model`) as NDJSON, CSV or an Arrow
+    IPC stream, one chunk of encoded bytes per `chunk_size` rows.
+
+    Rows come from a server-side cursor with `stream_scalars`, so the API
+    holds one chunk of ORM objects at a time no matter how large the range
+    is. Arrow reads plain row tuples instead and writes each chunk as a
+    record batch. The session is opened here rather than taken from the
+    request, because a streamed body is sent after request dependencies
+    have exited.
+    """
+    chunk_size = chunk_size or STREAM_CHUNK_SIZE
+    if media_type == ARROW:
+        encoder = ArrowStreamEncoder(model)
+        async with session_maker() as session:
+            result = await session.stream(table_query(stmt, model).execution_options(yield_per=chunk_size))
+            async for partition in result.partitions():
+                yield encoder.batch(partition)
+        yield encoder.close()
+        return
+
+    columns = [column.key for column in model.__table__.columns]
+    encode = _csv if media_type == CSV else _ndjson
+    if media_type == CSV:
+        yield _csv_lines([columns])
+
+    stmt = stmt.execution_options(yield_per=chunk_size)
+    async with session_maker() as session:
+        result = await session.stream_scalars(stmt)
+        async for partition in result.partitions():
+            # the session's identity map is weak, objects of a sent chunk are freed with it
+            yield encode(columns, partition)
+
+
+def stream_response(session_maker, stmt, model, media_type, filename):
+    headers = {"Content-Disposition": f'attachment; filename="{filename}.csv"'} if media_type == CSV else None
+    return StreamingResponse(stream_rows(session_maker, stmt, model, media_type), media_type=media_type, headers=headers)
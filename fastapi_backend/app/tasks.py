@@ -2,19 +2,30 @@ import os
 import asyncio
 from urllib.parse import urlparse
 from datetime import datetime, timezone
+from uuid import UUID
 from functools import reduce
 
-import httpx
 from bitcoinrpc import BitcoinRPC
+from celery import group
 
 from .celery_app import celery_app
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import select, insert
+from sqlalchemy import delete, func, select, update
 
-from .models import BlockData, ExchangeRate, ASIC, MWHRevenue
+from .models import BackfillChunk, BlockData, ExchangeRate, MWHRevenue
 from .config import settings
-from .utils import block_subsidy, amap, walk_chain
+from .crud import dialect_insert, get_checkpoint, rewind_checkpoints, set_checkpoint, upsert
+from .hashrate import HashrateWindow, lookup_for
+from .http_client import make_price_client
+from .locks import ingestion_lock, price_enrichment_flag
+from .prices import PriceCache
+from .ratelimit import price_rate_limiter
+from .revenue import RevenueEngine, recompute_revenue
+from .rollups import delete_rollups_above, refresh_rollups
+from .rpc import BatchRPC, HeaderCache
+from .writer import BulkWriter
+from .utils import block_subsidy, amap, achain, walk_chain, walk_heights
 import logging
 logger = logging.getLogger(__name__)
 
@@ -22,27 +33,33 @@ logger = logging.getLogger(__name__)
 # constants
 START_HEIGHT = int(settings.START_BLOCK_HEIGHT)
 RPC_URL      = settings.BTC_NODE_RPC_URL
+CONCURRENCY  = settings.INGEST_CONCURRENCY
+BATCH_SIZE   = settings.RPC_BATCH_SIZE
+METRICS_SOURCE = settings.BLOCK_METRICS_SOURCE
+LOCAL_HASHRATE = settings.LOCAL_HASHRATE
+PRICE_BATCH_SIZE = settings.PRICE_BATCH_SIZE
+# a queued enrich_prices older than this is dropped, and stops counting as pending
+PRICE_ENRICHMENT_EXPIRES = 590.0
+WRITE_BATCH_SIZE = settings.WRITE_BATCH_SIZE
+RECOMPUTE_CHUNK_SIZE = settings.RECOMPUTE_CHUNK_SIZE
+BACKFILL_CHUNK_SIZE = settings.BACKFILL_CHUNK_SIZE
 
+# ingestion_checkpoint stages, each stores the height up to which it is fully committed
+BLOCKS_STAGE  = "blocks"
+PRICES_STAGE  = "prices"
+REVENUE_STAGE = "revenue"
 
-# Extract block metrics
-async def extract_metrics(rpc, blk):
+
+# Build the metrics record from the raw rpc responses of a block.
+def build_metrics(blk, prev_blk, fees, nh):
     h  = blk["height"]
     ts = datetime.fromtimestamp(blk["time"], tz=timezone.utc)
     sub = block_subsidy(h)
 
-    # Get previous block so we can calculate the time delta.
-    prev_blk = await rpc.getblock(blk["previousblockhash"], 1)
+    # time delta to the previous block
     prev_blk_ts = datetime.fromtimestamp(prev_blk["time"], tz=timezone.utc)
     time_delta = ts - prev_blk_ts
 
-    # coinbase tx contains what miner received → subsidy + fees
-    coinbase = await rpc.getrawtransaction(blk["tx"][0], True, blk["hash"])
-    outs = list(map(lambda v: v.get("value", 0.0), coinbase.get("vout", [])))
-    total_out = reduce(lambda a, b: a + b, outs, 0.0)
-    fees      = total_out - sub
-
-    # get network hashrate at block height since last difficulty adjustment.
-    nh = await rpc.getnetworkhashps(height=h)
     return {
         "height": h,
         "timestamp": ts,
@@ -50,94 +67,287 @@ async def extract_metrics(rpc, blk):
         "fees": fees,
         "hashrate": nh,
         "time_delta_s": time_delta.total_seconds(),
+        "time": blk["time"],
+        "difficulty": blk.get("difficulty"),
+        "chainwork": blk.get("chainwork"),
+        "hash": blk["hash"],
+        "prevhash": blk.get("previousblockhash"),
     }
 
-async def calculate_revenue_mwh(db, data):
-    # get all available asic entries
-    asics = await db.execute(
-        select(ASIC)
-    )
-    asics = asics.scalars().all()
-
-    for asic in asics:
-        # Determine how many ASICs we need to consume 1MWh of energy.
-        # 1MWh = 1000000 Wh
-        number_of_asics = 1000000 / asic.asic_power    
-        total_hashrate = asic.asic_hash_rate * number_of_asics
-        # rpc server returns average per second network hashrate, we've calculated our total hashrate per second
-        # so we can just divide total_hashrate by network_hashrate (+ our extra hashrate) to get our share of the network.
-        # See: https://developer.bitcoin.org/reference/rpc/getnetworkhashps.html?highlight=getnetworkhashps
-        share_of_hashrate = total_hashrate / (data["hashrate"] + total_hashrate)
-        block_revenue = float(data["subsidy"]) + float(data["fees"])
-        share_of_revenue = block_revenue * share_of_hashrate
-        share_of_revenue_usd = share_of_revenue * data["price_usd"]
-        logger.info(f"block_revenue: {block_revenue}, number of asics: {number_of_asics}, total_hashrate: {total_hashrate}, share_of_hashrate: {share_of_hashrate}, share_of_revenue: {share_of_revenue}, share_of_revenue_usd: {share_of_revenue_usd}")
-
-        # write mwh revenue
-        await db.execute(
-            insert(MWHRevenue).values(
-                block_number=data["height"],
-                asic_id=asic.id,
-                mwh_btc_revenue=share_of_revenue,
-                mwh_usd_revenue=share_of_revenue_usd,
-                mwh_revenue_timestamp=data["timestamp"],
-            )
-        )
-        await db.commit()
+def coinbase_fees(blk, coinbase):
+    # coinbase tx contains what miner received → subsidy + fees
+    outs = list(map(lambda v: v.get("value", 0.0), coinbase.get("vout", [])))
+    total_out = reduce(lambda a, b: a + b, outs, 0.0)
+    return total_out - block_subsidy(blk["height"])
 
-# Add USD price
-async def fetch_price_usd(data):
-    ts       = data["timestamp"]
-    now      = datetime.now(timezone.utc)
-    age_secs = (now - ts).total_seconds()
-
-    # CG has changing granularity the further back in time we go on public api,
-    # Choose a half-window (in seconds) to match CG granularity:
-    # 0–1 day   → 5 min intervals → ±300 s
-    # 1–90 days → hourly        → ±3 600 s (1 h)
-    # 90–365 days → daily       → ±86 400 s (1 d)
-    # >365 days  → use daily too (but data may be missing)
-    if age_secs <= 86400:
-        half_window = 300
-    elif age_secs <= 90 * 86400:
-        half_window = 3600
+
+# Metrics sources decide how a block's fees are obtained. `verbosity` is used when fetching the block,
+# `fee_call` is the extra rpc call needed (None if the block already has everything) and `fees` turns
+# the block plus that call's result into the fee total in BTC.
+class RawTxSource:
+    """getblock(hash, 1) + getrawtransaction of the coinbase, needs -txindex or the blockhash hint."""
+    verbosity = 1
+
+    def fee_call(self, blk):
+        return ("getrawtransaction", [blk["tx"][0], True, blk["hash"]])
+
+    async def fetch_fees(self, rpc, blk):
+        return self.fees(blk, await rpc.getrawtransaction(blk["tx"][0], True, blk["hash"]))
+
+    def fees(self, blk, coinbase):
+        return coinbase_fees(blk, coinbase)
+
+
+class VerboseBlockSource:
+    """getblock(hash, 2) already carries the decoded coinbase, no extra call needed."""
+    verbosity = 2
+
+    def fee_call(self, blk):
+        return None
+
+    async def fetch_fees(self, rpc, blk):
+        return self.fees(blk, None)
+
+    def fees(self, blk, _):
+        return coinbase_fees(blk, blk["tx"][0])
+
+
+class BlockStatsSource:
+    """getblockstats computes the fee total on the node, works without -txindex."""
+    verbosity = 1
+    keys = ["totalfee"]
+
+    def fee_call(self, blk):
+        return ("getblockstats", [blk["hash"], self.keys])
+
+    async def fetch_fees(self, rpc, blk):
+        return self.fees(blk, await rpc.getblockstats(blk["hash"], *self.keys))
+
+    def fees(self, blk, stats):
+        return stats["totalfee"] / 100_000_000
+
+
+METRICS_SOURCES = {
+    "rawtx": RawTxSource(),
+    "verbose": VerboseBlockSource(),
+    "blockstats": BlockStatsSource(),
+}
+
+# Extract block metrics
+async def extract_metrics(rpc, blk, headers=None, source=None, local_hashrate=False):
+    source = source or METRICS_SOURCES["rawtx"]
+
+    # Get previous block so we can calculate the time delta, during a walk it is usually cached already.
+    async def fetch_prev(): return await rpc.getblock(blk["previousblockhash"], 1)
+    if headers is None:
+        prev_blk = await fetch_prev()
     else:
-        half_window = 86400
+        headers.put(blk)
+        prev_blk = await headers.get_or_fetch(blk["previousblockhash"], blk["height"] - 1, fetch_prev)
 
-    center = int(ts.timestamp())
-    frm    = center - half_window
-    to     = center + half_window
+    fees = await source.fetch_fees(rpc, blk)
 
-    url = (
-        "https://api.coingecko.com/api/v3/coins/bitcoin"
-        f"/market_chart/range?vs_currency=usd&from={frm}&to={to}"
-    )
-    async with httpx.AsyncClient() as client:
-        resp   = await client.get(url)
-        prices = resp.json().get("prices", [])
-
-    # throttle to ~5 calls/minute
-    await asyncio.sleep(12)
-
-    if not prices:
-        return {
-            **data,
-            "price_usd": None,
-            "price_timestamp": None,
-        }
+    # get network hashrate at block height since last difficulty adjustment,
+    # unless the pipeline computes it locally from the stored headers.
+    nh = None if local_hashrate else await rpc.getnetworkhashps(height=blk["height"])
+    return build_metrics(blk, prev_blk, fees, nh)
+
+# Extract metrics for a window of consecutive heights with one batch request per call type.
+async def extract_metrics_batch(batch, heights, headers=None, source=None, local_hashrate=False):
+    source = source or METRICS_SOURCES["rawtx"]
+    hashes = await batch.getblockhashes(list(heights))
+    blocks = await batch.getblocks(hashes, source.verbosity)
+
+    # the block before the window is only fetched when an earlier window hasn't cached it.
+    first = blocks[0]
+    prev_blk = headers.get(first["previousblockhash"]) if headers is not None else None
+    if prev_blk is None:
+        prev_blk = await batch.rpc.getblock(first["previousblockhash"], 1)
+    if headers is not None:
+        for blk in blocks:
+            headers.put(blk)
+
+    fee_calls = [source.fee_call(blk) for blk in blocks]
+    hash_calls = [] if local_hashrate else [("getnetworkhashps", [-1, blk["height"]]) for blk in blocks]
+    results = await batch.batch([call for call in fee_calls if call] + hash_calls)
+    fee_results = iter(results[:len(results) - len(hash_calls)])
+    hashrates = results[len(results) - len(hash_calls):] if hash_calls else [None] * len(blocks)
 
-    # pick the datapoint closest in time
-    ms, price = min(
-        prices,
-        key=lambda p: abs((p[0] / 1000) - ts.timestamp())
+    return [
+        build_metrics(blk, prev, source.fees(blk, next(fee_results) if call else None), nh)
+        for blk, prev, call, nh in zip(blocks, [prev_blk, *blocks], fee_calls, hashrates)
+    ]
+
+# Metrics for [start_height, end_height] read straight from the node's blk*.dat files through a
+# `blockfile.BlockIndex`, fees come from the coinbase and hashrate from the local window, no rpc involved.
+async def blockfile_metrics(index, start_height, end_height):
+    window = HashrateWindow()
+    lo = start_height - lookup_for(start_height, window.nblocks)
+    prev = None
+    for header in index.headers(max(lo - 1, 0), end_height):
+        height = header["height"]
+        window.push(height, header["time"], header["chainwork"])
+        if height >= start_height:
+            fees = index.coinbase_sats(height) / 100_000_000 - block_subsidy(height)
+            yield build_metrics(header, prev or header, fees, window.hashps())
+        prev = header
+
+# Load the headers the hashrate window needs before `start_height`, from the db where possible.
+async def seed_hashrate_window(db, batch, window, start_height):
+    lo = start_height - lookup_for(start_height, window.nblocks)
+    result = await db.execute(
+        select(BlockData.block_number, BlockData.block_timestamp, BlockData.chainwork)
+        .where(
+            BlockData.block_number >= lo,
+            BlockData.block_number < start_height,
+            BlockData.chainwork.is_not(None),
+        )
     )
+    known = {
+        row.block_number: (int(row.block_timestamp.timestamp()), row.chainwork)
+        for row in result.all()
+    }
+
+    # older rows (or a first run) have no chainwork yet, fetch those headers in one batch
+    missing = [h for h in range(lo, start_height) if h not in known]
+    if missing:
+        hashes = await batch.getblockhashes(missing)
+        fetched = await batch.batch([("getblockheader", [h, True]) for h in hashes])
+        for header in fetched:
+            known[header["height"]] = (header["time"], header["chainwork"])
+
+    for h in range(lo, start_height):
+        window.push(h, *known[h])
+
+# Fill in the hashrate of an in-order metrics record from the local window.
+async def fill_hashrate(rpc, window, rec):
+    window.push(rec["height"], rec["time"], rec["chainwork"])
+    nh = window.hashps()
+    if nh is None:
+        nh = await rpc.getnetworkhashps(height=rec["height"])
+    return {**rec, "hashrate": nh}
+
+async def calculate_revenue_mwh(db, data, engine=None):
+    # get all available asic entries, unless the caller already loaded them
+    engine = engine or await RevenueEngine.load(db)
+
+    # write mwh revenue for all asics at once
+    rows = engine.rows([data])
+    if rows:
+        await db.execute(upsert(db, MWHRevenue, ["block_number", "asic_id"]), rows)
+    await db.commit()
+
+# Add USD price
+async def fetch_price_usd(data, prices=None):
+    prices = prices or PriceCache()
+    price, price_timestamp = await prices.price_at(data["timestamp"])
     return {
         **data,
         "price_usd": price,
-        "price_timestamp": datetime.fromtimestamp(ms / 1000, tz=timezone.utc),
+        "price_timestamp": price_timestamp,
     }
 
-async def _run_pipeline():
+# Unpriced blocks after `after`, oldest first.
+async def fetch_unpriced_blocks(db, limit, after=-1):
+    result = await db.execute(
+        select(BlockData.block_number, BlockData.block_timestamp)
+        .outerjoin(ExchangeRate, ExchangeRate.block_number == BlockData.block_number)
+        .where(ExchangeRate.id.is_(None), BlockData.block_number > after)
+        .order_by(BlockData.block_number)
+        .limit(limit)
+    )
+    return result.all()
+
+# Price one batch of blocks in a single transaction.
+# Returns the heights that got a price and the last height looked at.
+async def enrich_price_batch(db, prices, limit, after=-1):
+    writer = BulkWriter(db, limit)
+    priced = []
+    last_seen = after
+    for block_number, block_timestamp in await fetch_unpriced_blocks(db, limit, after):
+        last_seen = block_number
+        price, price_timestamp = await prices.price_at(block_timestamp.replace(tzinfo=timezone.utc))
+        if price is None:
+            # provider has nothing close enough yet, a later run will retry this block
+            continue
+        writer.add_block(ExchangeRate, {
+            "block_number": block_number,
+            "exchange_rate": price,
+            "exchange_rate_timestamp": price_timestamp,
+        })
+        priced.append(block_number)
+    await writer.flush()
+    # price points fetched while resolving the batch are committed too
+    await db.commit()
+    return priced, last_seen
+
+# Write mwh revenue for priced blocks, one transaction for all of them.
+async def calculate_revenue_for_heights(db, heights, engine=None):
+    engine = engine or await RevenueEngine.load(db)
+    result = await db.execute(
+        select(BlockData, ExchangeRate)
+        .join(ExchangeRate, ExchangeRate.block_number == BlockData.block_number)
+        .where(BlockData.block_number.in_(heights))
+        .order_by(BlockData.block_number)
+    )
+    blocks = [
+        {
+            "height": block.block_number,
+            "timestamp": block.block_timestamp,
+            "subsidy": block.block_subsidy,
+            "fees": block.block_transaction_fees,
+            "hashrate": block.network_hash_rate,
+            "price_usd": rate.exchange_rate,
+        }
+        for block, rate in result.all()
+    ]
+    writer = BulkWriter(db, len(blocks))
+    for row in engine.rows(blocks):
+        writer.add(MWHRevenue, row)
+    await writer.flush()
+    if blocks:
+        # hour/day/epoch buckets these blocks belong to, committed below
+        await refresh_rollups(db, blocks[0]["height"], blocks[-1]["height"])
+    # a checkpoint written by the caller commits even when there was nothing to insert
+    await db.commit()
+
+# Move the prices checkpoint up to just before the first block still missing a price.
+async def advance_price_checkpoint(db):
+    after = await get_checkpoint(db, PRICES_STAGE, -1)
+    unpriced = await fetch_unpriced_blocks(db, 1, after)
+    if unpriced:
+        frontier = unpriced[0].block_number - 1
+    else:
+        result = await db.execute(select(func.max(BlockData.block_number)))
+        frontier = result.scalar()
+    if frontier is not None and frontier > after:
+        await set_checkpoint(db, PRICES_STAGE, frontier)
+        await db.commit()
+        return frontier
+    return after
+
+# Write revenue for every block between the revenue and prices checkpoints, `limit` blocks per transaction.
+async def catch_up_revenue(db, limit, engine=None):
+    engine = engine or await RevenueEngine.load(db)
+    done = await get_checkpoint(db, REVENUE_STAGE, -1)
+    target = await get_checkpoint(db, PRICES_STAGE, -1)
+    while done < target:
+        result = await db.execute(
+            select(BlockData.block_number)
+            .where(BlockData.block_number > done, BlockData.block_number <= target)
+            .order_by(BlockData.block_number)
+            .limit(limit)
+        )
+        heights = result.scalars().all()
+        if not heights:
+            break
+        # committed together with the batch's revenue rows
+        await set_checkpoint(db, REVENUE_STAGE, heights[-1])
+        await calculate_revenue_for_heights(db, heights, engine)
+        done = heights[-1]
+    return done
+
+def _session_maker():
     # setup DB
     parsed_db_url = urlparse(settings.DATABASE_URL)
 
@@ -148,66 +358,365 @@ async def _run_pipeline():
     )
 
     engine = create_async_engine(async_db_connection_url, future=True)
-    AsyncSessionLocal = sessionmaker(
+    return sessionmaker(
         bind=engine, class_=AsyncSession, expire_on_commit=False
     )
 
-    # Setup RPC + DB session
-    async with BitcoinRPC.from_config(RPC_URL, (
+async def _run_price_enrichment():
+    AsyncSessionLocal = _session_maker()
+    limiter = price_rate_limiter()
+    # blocks written from here on need a new run, this one may already be past them
+    flag = price_enrichment_flag(PRICE_ENRICHMENT_EXPIRES)
+    try:
+        await flag.clear()
+    finally:
+        await flag.aclose()
+    try:
+        async with AsyncSessionLocal() as db, make_price_client() as client:
+            prices = PriceCache(db, limiter=limiter, client=client)
+            # everything up to the checkpoint is priced already
+            last_seen = await get_checkpoint(db, PRICES_STAGE, -1)
+            while True:
+                priced, seen = await enrich_price_batch(db, prices, PRICE_BATCH_SIZE, last_seen)
+                await advance_price_checkpoint(db)
+                if priced:
+                    compute_revenue.delay(priced)
+                if seen == last_seen:
+                    return
+                last_seen = seen
+    finally:
+        await limiter.aclose()
+
+async def _run_revenue(heights):
+    AsyncSessionLocal = _session_maker()
+    async with AsyncSessionLocal() as db:
+        engine = await RevenueEngine.load(db)
+        # also picks up blocks a crashed run never got to
+        done = await catch_up_revenue(db, PRICE_BATCH_SIZE, engine)
+        # heights past a block that is still unpriced aren't covered by the checkpoint
+        heights = [h for h in heights if h > done]
+        if heights:
+            await calculate_revenue_for_heights(db, heights, engine)
+
+async def _run_recompute(asic_id):
+    AsyncSessionLocal = _session_maker()
+    async with AsyncSessionLocal() as db:
+        return await recompute_revenue(db, asic_id, RECOMPUTE_CHUNK_SIZE)
+
+def _rpc_client():
+    return BitcoinRPC.from_config(RPC_URL, (
         os.getenv("BTC_NODE_USER"),
         os.getenv("BTC_NODE_PASS"),
-    )) as rpc, AsyncSessionLocal() as db:
+    ))
+
+# Fetch and store the blocks in [start_height, end_height].
+# `checkpoint(last_height)` runs inside each batch's transaction, just before it commits.
+# A long-running caller can pass its own `headers` cache and hashrate `window` to keep them warm.
+async def ingest_heights(rpc, db, start_height, end_height, checkpoint=None, headers=None, window=None):
+    # build and run pipeline
+    headers = headers if headers is not None else HeaderCache()
+    source  = METRICS_SOURCES[METRICS_SOURCE]
+    batch   = BatchRPC(rpc)
+    if BATCH_SIZE > 1:
+        # batched mode: one POST per call type covers a whole window of heights.
+        async def fetch_window(i):
+            lo = start_height + i * BATCH_SIZE
+            hi = min(lo + BATCH_SIZE - 1, end_height)
+            return await extract_metrics_batch(batch, range(lo, hi + 1), headers, source, LOCAL_HASHRATE)
+
+        last_window = (end_height - start_height) // BATCH_SIZE
+        metrics = achain(walk_heights(0, last_window, fetch_window, max(CONCURRENCY, 1)))
+    elif CONCURRENCY > 1:
+        # pipelined mode: resolve heights directly so several blocks can be in flight at once.
+        async def fetch_block_at(height):
+            return await rpc.getblock(await rpc.getblockhash(height), source.verbosity)
+
+        async def fetch_metrics(height):
+            # tracked so the next height can reuse this block instead of refetching it
+            blk = await headers.track(height, fetch_block_at(height))
+            return await extract_metrics(rpc, blk, headers, source, LOCAL_HASHRATE)
+
+        metrics = walk_heights(start_height, end_height, fetch_metrics, CONCURRENCY)
+    else:
+        async def fetch_block(h): return await rpc.getblock(h, source.verbosity)
+        def next_hash_of(blk):
+            return blk.get("nextblockhash") if blk["height"] < end_height else None
+
+        start_hash = await rpc.getblockhash(start_height)
+        chain   = walk_chain(start_hash, fetch_block, next_hash_of)
+        metrics = amap(lambda b: extract_metrics(rpc, b, headers, source, LOCAL_HASHRATE), chain)
+
+    if LOCAL_HASHRATE:
+        # records arrive in height order, so the window can slide along with them.
+        window = window if window is not None else HashrateWindow()
+        # a window left at the previous height carries straight on
+        if window.tip != start_height - 1:
+            window.clear()
+            await seed_hashrate_window(db, batch, window, start_height)
+        metrics = amap(lambda rec: fill_hashrate(rpc, window, rec), metrics)
 
-        # find starting point
+    await store_metrics(db, metrics, start_height, checkpoint)
+
+# Queue enrich_prices unless a run is already waiting, which will pick up these blocks as well.
+# Parallel backfill chunks would otherwise queue a run each, all spending the same provider quota.
+async def request_price_enrichment():
+    flag = price_enrichment_flag(PRICE_ENRICHMENT_EXPIRES)
+    try:
+        if await flag.set():
+            enrich_prices.apply_async(expires=PRICE_ENRICHMENT_EXPIRES)
+    finally:
+        await flag.aclose()
+
+# Write in-order metrics records starting at `start_height`, one transaction per WRITE_BATCH_SIZE blocks.
+async def store_metrics(db, metrics, start_height, checkpoint=None):
+    # blocks written since prices were last requested, they're requested every PRICE_BATCH_SIZE
+    unpriced = 0
+
+    async def flush(writer, first_height, last_height):
+        nonlocal unpriced
+        if last_height is None:
+            return
+        if checkpoint is not None:
+            await checkpoint(last_height)
+        # later stages may already be past these heights, e.g. when a backfill fills a gap
+        await rewind_checkpoints(db, [PRICES_STAGE, REVENUE_STAGE], first_height - 1)
+        unpriced += await writer.flush()
+        if unpriced >= PRICE_BATCH_SIZE:
+            await request_price_enrichment()
+            unpriced = 0
+
+    # prices are filled in by the enrich_prices stage so a slow provider never stalls ingestion.
+    # rows are upserts, a replayed range just rewrites the heights that are already stored.
+    writer = BulkWriter(db, WRITE_BATCH_SIZE)
+    first_height = last_height = None
+    # every block must build on the one stored (or just fetched) below it
+    parent = await stored_hash(db, start_height - 1)
+    async for rec in metrics:
+        if parent is not None and rec["prevhash"] != parent:
+            raise ReorgDetected(rec["height"])
+        parent = rec["hash"]
+        writer.add_block(BlockData, {
+            "block_number": rec["height"],
+            "block_timestamp": rec["timestamp"],
+            "block_subsidy": rec["subsidy"],
+            "block_transaction_fees": rec["fees"],
+            "network_hash_rate": rec["hashrate"],
+            "difficulty": rec["difficulty"],
+            "chainwork": rec["chainwork"],
+            "block_hash": rec["hash"],
+        })
+        if first_height is None:
+            first_height = rec["height"]
+        last_height = rec["height"]
+        if writer.full:
+            await flush(writer, first_height, last_height)
+            first_height = last_height = None
+
+    await flush(writer, first_height, last_height)
+    if unpriced:
+        await request_price_enrichment()
+
+class ReorgDetected(Exception):
+    """A fetched block doesn't build on the stored block below it."""
+
+    def __init__(self, height):
+        super().__init__(f"block {height} does not extend the stored chain")
+        self.height = height
+
+async def stored_hash(db, height):
+    result = await db.execute(select(BlockData.block_hash).where(BlockData.block_number == height))
+    return result.scalars().first()
+
+# Highest height at or below `height` where the stored block is still on the node's best chain.
+# Looks back in doubling windows, so the cost follows the depth of the reorg.
+async def find_fork_point(db, batch, height):
+    span = 8
+    while height >= 0:
+        lo = max(height - span + 1, 0)
+        result = await db.execute(
+            select(BlockData.block_number, BlockData.block_hash)
+            .where(BlockData.block_number.between(lo, height))
+        )
+        stored = dict(result.all())
+        node = await batch.getblockhashes(range(lo, height + 1))
+        for h, blockhash in zip(range(height, lo - 1, -1), reversed(node)):
+            # rows from before block hashes were stored can't be checked and are trusted
+            if stored.get(h) in (None, blockhash):
+                return h
+        height = lo - 1
+        span *= 2
+    return -1
+
+# Drop every block above `height` together with its price and revenue rows, in one transaction.
+async def rollback_above(db, height):
+    for model in (MWHRevenue, ExchangeRate, BlockData):
+        await db.execute(delete(model).where(model.block_number > height))
+    await delete_rollups_above(db, height)
+    await set_checkpoint(db, BLOCKS_STAGE, height)
+    await rewind_checkpoints(db, [PRICES_STAGE, REVENUE_STAGE], height)
+    await db.commit()
+
+# Ingest everything between the blocks checkpoint and the node's tip, False when there was nothing new.
+async def ingest_to_tip(rpc, db, headers=None, window=None):
+    # find starting point, databases from before checkpoints resume after the highest stored block
+    last = await get_checkpoint(db, BLOCKS_STAGE)
+    if last is None:
         result = await db.execute(
             select(BlockData.block_number)
             .order_by(BlockData.block_number.desc())
             .limit(1)
         )
         last = result.scalars().first()
-        tip_height = await rpc.getblockcount()
-        if last is None:
-            # first run, we could make a full backfill but for demo purposes we can specify a recent block.
-            start_hash = await rpc.getblockhash(START_HEIGHT)
-        else:
-            # get hash of next block
-            if last + 1 > tip_height:
+    tip_height = await rpc.getblockcount()
+    if last is not None:
+        # the stored tip must still be on the node's chain, otherwise roll back to the fork point.
+        # A node behind us (restart with -reindex, IBD, lagging node) is compared at its own tip.
+        check = min(last, tip_height)
+        stored = await stored_hash(db, check)
+        if stored is not None and stored != await rpc.getblockhash(check):
+            fork = await find_fork_point(db, BatchRPC(rpc), check)
+            logger.warning("chain reorganisation, rolling back blocks %d-%d", fork + 1, last)
+            await rollback_above(db, fork)
+            if headers is not None:
+                headers.clear()
+            if window is not None:
+                window.clear()
+            last = fork
+        elif last > tip_height:
+            logger.info("node tip %d is behind stored block %d, waiting for it to catch up", tip_height, last)
+            return False
+    if last is None:
+        # first run, we could make a full backfill but for demo purposes we can specify a recent block.
+        start_height = START_HEIGHT
+    else:
+        # get hash of next block
+        if last + 1 > tip_height:
+            return False
+
+        start_height = last + 1
+
+    async def checkpoint(last_height):
+        await set_checkpoint(db, BLOCKS_STAGE, last_height)
+
+    try:
+        await ingest_heights(rpc, db, start_height, tip_height, checkpoint, headers, window)
+    except ReorgDetected as e:
+        # the chain moved while we were ingesting, the next pass finds the fork point
+        logger.warning("%s, will retry", e)
+        await db.rollback()
+    return True
+
+async def _run_pipeline():
+    AsyncSessionLocal = _session_maker()
+
+    # Setup RPC + DB session
+    async with _rpc_client() as rpc, AsyncSessionLocal() as db:
+        return await ingest_to_tip(rpc, db)
+
+# Split [start_height, end_height] into chunks, record them and return the ones still to do.
+async def plan_backfill(db, start_height, end_height, chunk_size):
+    ranges = [
+        (lo, min(lo + chunk_size - 1, end_height))
+        for lo in range(start_height, end_height + 1, chunk_size)
+    ]
+    if ranges:
+        await db.execute(
+            dialect_insert(db, BackfillChunk)
+            .values([{"start_height": lo, "end_height": hi, "status": "pending"} for lo, hi in ranges])
+            .on_conflict_do_nothing(index_elements=["start_height", "end_height"])
+        )
+        await db.commit()
+
+    result = await db.execute(
+        select(BackfillChunk.start_height, BackfillChunk.end_height)
+        .where(
+            BackfillChunk.start_height >= start_height,
+            BackfillChunk.end_height <= end_height,
+            BackfillChunk.status != "done",
+        )
+        .order_by(BackfillChunk.start_height)
+    )
+    return [tuple(row) for row in result.all()]
+
+# Ingest one chunk, resuming after the last height it committed.
+async def backfill_chunk_range(rpc, db, start_height, end_height):
+    def progress(**values):
+        return (
+            update(BackfillChunk)
+            .where(BackfillChunk.start_height == start_height, BackfillChunk.end_height == end_height)
+            .values(updated_at=datetime.now(timezone.utc), **values)
+        )
+
+    result = await db.execute(
+        select(BackfillChunk.last_height, BackfillChunk.status)
+        .where(BackfillChunk.start_height == start_height, BackfillChunk.end_height == end_height)
+    )
+    row = result.first()
+    if row is not None and row.status == "done":
+        return
+    resume = start_height if row is None or row.last_height is None else row.last_height + 1
+
+    await db.execute(progress(status="running"))
+    await db.commit()
+
+    async def checkpoint(last_height):
+        await db.execute(progress(last_height=last_height))
+
+    if resume <= end_height:
+        await ingest_heights(rpc, db, resume, end_height, checkpoint)
+    await db.execute(progress(status="done", last_height=end_height))
+    await db.commit()
+
+async def _run_backfill(start_height, end_height, chunk_size):
+    AsyncSessionLocal = _session_maker()
+    async with _rpc_client() as rpc, AsyncSessionLocal() as db:
+        if end_height is None:
+            end_height = await rpc.getblockcount()
+        chunks = await plan_backfill(db, start_height, end_height, chunk_size)
+    # every chunk is its own task, so the range spreads over all backfill workers
+    group(backfill_chunk.s(lo, hi) for lo, hi in chunks).apply_async()
+    return len(chunks)
+
+async def _run_backfill_chunk(start_height, end_height):
+    AsyncSessionLocal = _session_maker()
+    async with _rpc_client() as rpc, AsyncSessionLocal() as db:
+        await backfill_chunk_range(rpc, db, start_height, end_height)
+
+# Only one ingestion run at a time across all workers, a duplicate exits straight away.
+async def _run_pipeline_single_flight():
+    lock = ingestion_lock()
+    try:
+        async with lock.held() as acquired:
+            if not acquired:
+                logger.info("ingestion already running, skipping this run")
                 return
-            
-            start_hash = await rpc.getblockhash(last + 1)
-
-        # build and run pipeline
-        async def fetch_block(h): return await rpc.getblock(h, 1)
-        def next_hash_of(blk): return blk.get("nextblockhash")
-
-        chain     = walk_chain(start_hash, fetch_block, next_hash_of)
-        metrics   = amap(lambda b: extract_metrics(rpc, b), chain)
-        enriched  = amap(fetch_price_usd,   metrics)
-
-        async for rec in enriched:
-            # write block_data
-            await db.execute(
-                insert(BlockData).values(
-                    block_number=rec["height"],
-                    block_timestamp=rec["timestamp"],
-                    block_subsidy=rec["subsidy"],
-                    block_transaction_fees=rec["fees"],
-                    network_hash_rate=rec["hashrate"],
-                )
-            )
-            # write exchange_rate
-            await db.execute(
-                insert(ExchangeRate).values(
-                    block_number=rec["height"],
-                    exchange_rate=rec["price_usd"],
-                    exchange_rate_timestamp=rec["price_timestamp"],
-                )
-            )
-            await db.commit()
-
-            # Compute and write mwh revenue for each asic
-            await calculate_revenue_mwh(db, rec)
+            # blocks found while this run held the lock had their own run skipped, so go again until caught up
+            while await _run_pipeline():
+                pass
+    finally:
+        await lock.aclose()
 
 @celery_app.task(name="app.tasks.fetch_and_store_all")
 def fetch_and_store_all():
-    asyncio.run(_run_pipeline())
+    asyncio.run(_run_pipeline_single_flight())
+
+@celery_app.task(name="app.tasks.enrich_prices")
+def enrich_prices():
+    asyncio.run(_run_price_enrichment())
+
+@celery_app.task(name="app.tasks.compute_revenue")
+def compute_revenue(heights):
+    asyncio.run(_run_revenue(heights))
+
+@celery_app.task(name="app.tasks.recompute_revenue")
+def recompute_revenue_task(asic_id=None):
+    # asic_id is a UUID string, None recomputes every asic
+    return asyncio.run(_run_recompute(UUID(asic_id) if asic_id else None))
+
+@celery_app.task(name="app.tasks.backfill")
+def backfill(start_height=START_HEIGHT, end_height=None, chunk_size=BACKFILL_CHUNK_SIZE):
+    return asyncio.run(_run_backfill(start_height, end_height, chunk_size))
+
+@celery_app.task(name="app.tasks.backfill_chunk")
+def backfill_chunk(start_height, end_height):
+    asyncio.run(_run_backfill_chunk(start_height, end_height))
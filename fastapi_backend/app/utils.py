@@ -1,3 +1,6 @@
+import asyncio
+from collections import deque
+
 from fastapi.routing import APIRoute
 from app.schemas import BlockData, ExchangeRate
 
@@ -12,12 +15,37 @@ def walk_chain(seed, fetch, nxt):
             current = nxt(blk)
     return _gen()
 
+def walk_heights(start, stop, fetch, concurrency):
+    # Keep up to `concurrency` fetches in flight while yielding results in
+    # height order, so throughput is bounded by the node rather than latency.
+    async def _gen():
+        pending = deque()
+        height = start
+        try:
+            while pending or height <= stop:
+                while height <= stop and len(pending) < concurrency:
+                    pending.append(asyncio.ensure_future(fetch(height)))
+                    height += 1
+                yield await pending.popleft()
+        finally:
+            for task in pending:
+                task.cancel()
+    return _gen()
+
 def amap(func, agen):
     async def _gen():
         async for item in agen:
             yield await func(item)
     return _gen()
 
+def achain(agen):
+    # flatten an async generator of lists into an async generator of items
+    async def _gen():
+        async for items in agen:
+            for item in items:
+                yield item
+    return _gen()
+
 def block_subsidy(height):
     halvings = height // 210_000
     if halvings >= 64:
@@ -25,5 +53,17 @@ def block_subsidy(height):
     sats = 50 * 100_000_000 >> halvings
     return sats / 100_000_000
 
+def mwh_revenue(asic_hash_rate, asic_power, network_hash_rate, block_reward, price_usd):
+    # Determine how many ASICs we need to consume 1MWh of energy.
+    # 1MWh = 1000000 Wh
+    number_of_asics = 1000000 / asic_power
+    total_hashrate = asic_hash_rate * number_of_asics
+    # network hashrate is an average per second, so is ours, our share of the network is
+    # total_hashrate / (network_hashrate + our extra hashrate).
+    # See: https://developer.bitcoin.org/reference/rpc/getnetworkhashps.html?highlight=getnetworkhashps
+    share_of_hashrate = total_hashrate / (network_hash_rate + total_hashrate)
+    share_of_revenue = block_reward * share_of_hashrate
+    return share_of_revenue, share_of_revenue * price_usd
+
 def simple_generate_unique_route_id(route: APIRoute):
     return f"{route.tags[0]}-{route.name}"
\ No newline at end of file
@@ -0,0 +1,66 @@
+from collections import defaultdict
+
+from sqlalchemy import insert
+
+from .crud import upsert
+from .models import BlockData, ExchangeRate, MWHRevenue
+
+
+# natural keys of the ingestion tables, rows written for a key that already exists replace it
+UPSERT_KEYS = {
+    BlockData: ["block_number"],
+    ExchangeRate: ["block_number"],
+    MWHRevenue: ["block_number", "asic_id"],
+}
+
+
+class BulkWriter:
+    """
+    Buffers rows per model and writes them as one multi-row INSERT per table
+    (executemany / insertmanyvalues) inside a single transaction.
+
+    Callers `add` rows as they are produced and `flush` once `full`, so a
+    window of blocks costs one round trip per table and one commit instead
+    of one of each per row.
+
+    Models listed in `conflict_keys` (model -> unique columns) are written
+    as ON CONFLICT upserts, so replaying a window is harmless.
+    """
+
+    def __init__(self, db, window, conflict_keys=UPSERT_KEYS):
+        self._db = db
+        self._window = window
+        self._conflict_keys = conflict_keys
+        self._rows = defaultdict(list)
+        self._blocks = 0
+
+    @property
+    def full(self):
+        return self._blocks >= self._window
+
+    def add(self, model, row):
+        self._rows[model].append(row)
+
+    def add_block(self, model, row):
+        # rows added this way count towards the window size
+        self.add(model, row)
+        self._blocks += 1
+
+    def _statement(self, model):
+        keys = self._conflict_keys.get(model)
+        if keys is None:
+            return insert(model)
+        return upsert(self._db, model, keys)
+
+    async def flush(self):
+        # anything the caller executed on the session since the last flush commits with the rows
+        if not self._rows:
+            return 0
+        written = self._blocks
+        # models are written in insertion order so parents go before their children
+        for model, rows in self._rows.items():
+            await self._db.execute(self._statement(model), rows)
+        await self._db.commit()
+        self._rows.clear()
+        self._blocks = 0
+        return written
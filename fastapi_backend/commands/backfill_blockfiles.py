@@ -0,0 +1,31 @@
+import argparse
+import asyncio
+
+from app.blockfile import NETWORK_MAGIC, BlockIndex
+from app.config import settings
+from app.database import async_session_maker
+from app.tasks import blockfile_metrics, store_metrics
+
+
+async def main(blocks_dir, network, start, end):
+    index = BlockIndex(blocks_dir, network).scan()
+    try:
+        end = index.tip_height if end is None else min(end, index.tip_height)
+        print(f"Indexed {index.tip_height + 1} blocks, loading {start}-{end}")
+        async with async_session_maker() as db:
+            await store_metrics(db, blockfile_metrics(index, start, end), start)
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Backfill block_data from bitcoind's blk*.dat files without going through rpc."
+    )
+    parser.add_argument("--blocks-dir", default=settings.BTC_BLOCKS_DIR, required=settings.BTC_BLOCKS_DIR is None)
+    parser.add_argument("--network", choices=sorted(NETWORK_MAGIC), default="main")
+    parser.add_argument("--start", type=int, default=int(settings.START_BLOCK_HEIGHT))
+    parser.add_argument("--end", type=int, help="last height to load (default: the files' tip)")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.blocks_dir, args.network, args.start, args.end))
@@ -0,0 +1,24 @@
+import argparse
+import asyncio
+from uuid import UUID
+
+from app.config import settings
+from app.database import async_session_maker
+from app.revenue import recompute_revenue
+
+
+async def main(asic_id, chunk_size):
+    async with async_session_maker() as db:
+        written = await recompute_revenue(db, asic_id, chunk_size)
+    print(f"Recomputed {written} mwh revenue rows")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Fill or refresh mwh_revenue over the full block history."
+    )
+    parser.add_argument("--asic-id", type=UUID, help="only recompute this asic (default: all)")
+    parser.add_argument("--chunk-size", type=int, default=settings.RECOMPUTE_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.asic_id, args.chunk_size))
@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 from httpx import AsyncClient, ASGITransport
 import pytest_asyncio
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
@@ -5,7 +7,7 @@ from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_asyn
 from app.config import settings
 from app.models import Base
 
-from app.database import get_async_session
+from app.database import get_async_session, get_async_session_maker
 from app.main import app
 
 
@@ -54,8 +56,14 @@ async def test_client(db_session):
         finally:
             await db_session.close()
 
+    # Streamed responses open their own session, hand them the test one too
+    @asynccontextmanager
+    async def test_session_maker():
+        yield db_session
+
     # Set up test database overrides
     app.dependency_overrides[get_async_session] = override_get_async_session
+    app.dependency_overrides[get_async_session_maker] = lambda: test_session_maker
 
     async with AsyncClient(
         transport=ASGITransport(app=app), base_url="http://localhost:8000"
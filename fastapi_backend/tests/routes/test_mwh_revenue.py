@@ -1,7 +1,7 @@
 import pytest
 from fastapi import status
 from sqlalchemy import select, insert
-from app.models import ASIC, MWHRevenue
+from app.models import ASIC, BlockData, ExchangeRate, MWHRevenue
 from uuid import uuid4
 from datetime import datetime, timedelta
 
@@ -35,7 +35,7 @@ class TestMwhRevenue:
                 "asic_id": asic_data["id"],
                 "mwh_usd_revenue": 1000,
                 "mwh_btc_revenue": 0.00001,
-                "block_number": 1000,
+                "block_number": 1001,
                 "mwh_revenue_timestamp": datetime.now(),
             }
         ]
@@ -51,3 +51,78 @@ class TestMwhRevenue:
 
         assert len(mwh_revenue) == 2
         assert any(str(asic_data["id"]) == str(row["asic_id"]) for row in mwh_revenue)
+
+    @pytest.mark.asyncio(loop_scope="function")
+    async def test_read_mwh_revenue_with_hashrate_window(self, test_client, db_session):
+        """Revenue is recomputed with the hashrate averaged over the requested window."""
+
+        asic_id = uuid4()
+        await db_session.execute(insert(ASIC).values(
+            id=asic_id, asic_slug="test-asic", asic_name="Test ASIC",
+            asic_power=1_000_000, asic_hash_rate=1_000,
+        ))
+
+        start = datetime.now() - timedelta(hours=5)
+        for i, height in enumerate(range(100, 106)):
+            ts = start + timedelta(minutes=10 * i)
+            # every block adds 600_000 work in 600 s → 1_000 H/s
+            await db_session.execute(insert(BlockData).values(
+                id=uuid4(), block_number=height, block_timestamp=ts,
+                block_subsidy=3.125, block_transaction_fees=0.0, network_hash_rate=1.0,
+                chainwork=hex(600_000 * (i + 1)),
+            ))
+            await db_session.execute(insert(ExchangeRate).values(
+                id=uuid4(), block_number=height, exchange_rate=100_000.0, exchange_rate_timestamp=ts,
+            ))
+            await db_session.execute(insert(MWHRevenue).values(
+                id=uuid4(), asic_id=asic_id, block_number=height, mwh_revenue_timestamp=ts,
+                mwh_btc_revenue=0.0, mwh_usd_revenue=0.0,
+            ))
+
+        read_response = await test_client.get("/mwh_revenue/", params={
+            "asic_id": str(asic_id),
+            "timestamp_start": (start - timedelta(minutes=1)).isoformat(),
+            "timestamp_end": datetime.now().isoformat(),
+            "hashrate_window": 2,
+        })
+        assert read_response.status_code == status.HTTP_200_OK
+        rows = {row["block_number"]: row for row in read_response.json()}
+
+        # the first two heights don't have two earlier blocks stored
+        assert rows[100]["window_hash_rate"] is None
+        assert rows[101]["window_hash_rate"] is None
+        assert rows[105]["window_hash_rate"] == pytest.approx(1_000.0)
+        # our 1 MWh fleet equals the network hashrate → half of the block reward
+        assert rows[105]["window_mwh_btc_revenue"] == pytest.approx(3.125 / 2)
+        assert rows[105]["window_mwh_usd_revenue"] == pytest.approx(3.125 / 2 * 100_000.0)
+
+    @pytest.mark.asyncio(loop_scope="function")
+    async def test_read_mwh_revenue_downsampled(self, test_client, db_session):
+        """max_points caps the rows returned and keeps the revenue spike."""
+
+        asic_id = uuid4()
+        await db_session.execute(insert(ASIC).values(
+            id=asic_id, asic_slug="test-asic", asic_name="Test ASIC",
+            asic_power=1_000_000, asic_hash_rate=1_000,
+        ))
+
+        start = datetime.now() - timedelta(days=2)
+        for i, height in enumerate(range(100, 300)):
+            await db_session.execute(insert(MWHRevenue).values(
+                id=uuid4(), asic_id=asic_id, block_number=height,
+                mwh_revenue_timestamp=start + timedelta(minutes=10 * i),
+                mwh_btc_revenue=0.0001, mwh_usd_revenue=5_000.0 if height == 177 else 10.0 + i % 3,
+            ))
+
+        read_response = await test_client.get("/mwh_revenue/", params={
+            "asic_id": str(asic_id),
+            "timestamp_start": (start - timedelta(minutes=1)).isoformat(),
+            "timestamp_end": datetime.now().isoformat(),
+            "max_points": 20,
+        })
+        assert read_response.status_code == status.HTTP_200_OK
+        heights = [row["block_number"] for row in read_response.json()]
+
+        assert len(heights) == 20
+        assert heights[0] == 100 and heights[-1] == 299
+        assert 177 in heights
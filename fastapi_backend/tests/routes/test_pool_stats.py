@@ -0,0 +1,18 @@
+import pytest
+from fastapi import status
+
+
+class TestPoolStats:
+
+    @pytest.mark.asyncio(loop_scope="function")
+    async def test_read_pool_stats(self, test_client, mocker):
+        """Pool statistics reflect the configured pool mode."""
+        mocker.patch("app.routes.pool_stats.pool_stats", return_value={
+            "mode": "queue", "size": 5, "checked_in": 4, "checked_out": 1, "overflow": -4,
+        })
+
+        response = await test_client.get("/pool_stats/")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == {
+            "mode": "queue", "size": 5, "checked_in": 4, "checked_out": 1, "overflow": -4,
+        }
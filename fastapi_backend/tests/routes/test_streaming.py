@@ -0,0 +1,144 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pyarrow as pa
+import pytest
+from fastapi import status
+from sqlalchemy import insert
+
+from app.models import ASIC, BlockData, ExchangeRate, MWHRevenue
+from app.columnar import ARROW
+from app.streaming import CSV, NDJSON, stream_format
+
+
+def test_stream_format():
+    assert stream_format(None) is None
+    assert stream_format("application/json") is None
+    assert stream_format("application/x-ndjson") == NDJSON
+    assert stream_format("text/html, text/csv;q=0.9, */*;q=0.8") == CSV
+    # q=0 rules a type out, the rest are ranked by q before JSON is picked
+    assert stream_format("text/csv;q=0, application/json") is None
+    assert stream_format("text/csv; q=0.0") is None
+    assert stream_format("application/json;q=0.5, text/csv") == CSV
+    assert stream_format("text/csv;q=0.4, */*;q=0.5") is None
+    assert stream_format("text/csv;q=0.4, application/x-ndjson;q=0.8") == NDJSON
+
+
+@pytest.fixture
+async def chain(db_session):
+    asic_id = uuid4()
+    await db_session.execute(insert(ASIC).values(
+        id=asic_id, asic_slug="test-asic", asic_name="Test ASIC", asic_power=1_000_000, asic_hash_rate=1_000,
+    ))
+    start = datetime.now() - timedelta(days=1)
+    for i, height in enumerate(range(100, 125)):
+        ts = start + timedelta(minutes=10 * i)
+        await db_session.execute(insert(BlockData).values(
+            id=uuid4(), block_number=height, block_timestamp=ts,
+            block_subsidy=3.125, block_transaction_fees=0.1, network_hash_rate=1_000.0 + i,
+        ))
+        await db_session.execute(insert(ExchangeRate).values(
+            id=uuid4(), block_number=height, exchange_rate=100_000.0, exchange_rate_timestamp=ts,
+        ))
+        await db_session.execute(insert(MWHRevenue).values(
+            id=uuid4(), asic_id=asic_id, block_number=height, mwh_revenue_timestamp=ts,
+            mwh_btc_revenue=0.001 * i, mwh_usd_revenue=100.0 * i,
+        ))
+    # streamed bodies are sent after the request's session is closed, which would roll back
+    await db_session.commit()
+    return asic_id, start - timedelta(minutes=1), datetime.now()
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_block_data_ndjson(test_client, chain, mocker):
+    _, start, end = chain
+    # several partitions, so rows are spread over more than one chunk
+    mocker.patch("app.streaming.STREAM_CHUNK_SIZE", 10)
+    response = await test_client.get(
+        "/block_data/",
+        params={"block_timestamp_start": start.isoformat(), "block_timestamp_end": end.isoformat()},
+        headers={"Accept": NDJSON},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith(NDJSON)
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["block_number"] for row in rows] == list(range(100, 125))
+    assert rows[3]["network_hash_rate"] == 1_003.0
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_mwh_revenue_csv(test_client, chain):
+    asic_id, start, end = chain
+    response = await test_client.get(
+        "/mwh_revenue/",
+        params={"asic_id": str(asic_id), "timestamp_start": start.isoformat(), "timestamp_end": end.isoformat()},
+        headers={"Accept": CSV},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith(CSV)
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 25
+    assert rows[0]["asic_id"] == str(asic_id)
+    assert float(rows[4]["mwh_usd_revenue"]) == 400.0
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_exchange_rate_ndjson(test_client, chain):
+    _, start, end = chain
+    response = await test_client.get(
+        "/exchange_rate/",
+        params={"exchange_rate_timestamp_start": start.isoformat(), "exchange_rate_timestamp_end": end.isoformat()},
+        headers={"Accept": NDJSON},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.text.splitlines()) == 25
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_stream_rejects_in_memory_options(test_client, chain):
+    asic_id, start, end = chain
+    response = await test_client.get(
+        "/mwh_revenue/",
+        params={
+            "asic_id": str(asic_id), "timestamp_start": start.isoformat(), "timestamp_end": end.isoformat(),
+            "max_points": 10,
+        },
+        headers={"Accept": CSV},
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_mwh_revenue_columnar(test_client, chain):
+    asic_id, start, end = chain
+    params = {"asic_id": str(asic_id), "timestamp_start": start.isoformat(), "timestamp_end": end.isoformat()}
+    response = await test_client.get("/mwh_revenue/", params={**params, "columnar": True})
+    assert response.status_code == status.HTTP_200_OK
+    columns = response.json()
+    assert columns["block_number"] == list(range(100, 125))
+    assert columns["mwh_usd_revenue"][4] == 400.0
+    assert set(columns["asic_id"]) == {str(asic_id)}
+
+    response = await test_client.get("/mwh_revenue/", params={**params, "columnar": True, "max_points": 5})
+    columns = response.json()
+    assert len(columns["block_number"]) == 5
+    assert columns["block_number"][0] == 100 and columns["block_number"][-1] == 124
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_block_data_arrow(test_client, chain, mocker):
+    _, start, end = chain
+    mocker.patch("app.streaming.STREAM_CHUNK_SIZE", 10)
+    response = await test_client.get(
+        "/block_data/",
+        params={"block_timestamp_start": start.isoformat(), "block_timestamp_end": end.isoformat()},
+        headers={"Accept": ARROW},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.num_rows == 25
+    assert table.column("block_number").to_pylist() == list(range(100, 125))
+    assert table.schema.field("block_timestamp").type == pa.timestamp("us", tz="UTC")
@@ -7,7 +7,12 @@ from unittest.mock import AsyncMock, MagicMock
 import httpx
 import asyncio as _asyncio
 
-from app.tasks import extract_metrics, calculate_revenue_mwh, fetch_price_usd
+from app.rpc import HeaderCache
+from app.tasks import (
+    extract_metrics, extract_metrics_batch, calculate_revenue_mwh, fetch_price_usd, METRICS_SOURCES,
+    enrich_price_batch, calculate_revenue_for_heights,
+)
+from app.models import BlockData, ExchangeRate, MWHRevenue
 from app.models import ASIC
 from sqlalchemy import select
 from sqlalchemy.sql.selectable import Select
@@ -20,6 +25,7 @@ async def test_extract_metrics():
         'height': 10,
         'time': timestamp,
         'hash': 'blockhash',
+        'previousblockhash': 'prevhash',
         'tx': ['txid1'],
     }
     # Mock rpc methods
@@ -39,6 +45,78 @@ async def test_extract_metrics():
     assert data['hashrate'] == 100.0
     assert data['time_delta_s'] == pytest.approx(600.0)
 
+@pytest.mark.asyncio
+async def test_extract_metrics_uses_cached_previous_block():
+    rpc = AsyncMock()
+    rpc.getrawtransaction.return_value = {'vout': [{'value': 50.0}]}
+    rpc.getnetworkhashps.return_value = 100.0
+
+    headers = HeaderCache()
+    headers.put({'hash': 'prevhash', 'height': 9, 'time': 1_600_000_000 - 600})
+    blk = {
+        'height': 10,
+        'time': 1_600_000_000,
+        'hash': 'blockhash',
+        'previousblockhash': 'prevhash',
+        'tx': ['txid1'],
+    }
+
+    data = await extract_metrics(rpc, blk, headers)
+
+    rpc.getblock.assert_not_called()
+    assert data['time_delta_s'] == pytest.approx(600.0)
+    # the block itself is now cached for the next height
+    assert headers.get(10)['hash'] == 'blockhash'
+
+@pytest.mark.asyncio
+async def test_extract_metrics_verbose_block_needs_no_extra_call():
+    rpc = AsyncMock()
+    rpc.getblock.return_value = {'time': 1_600_000_000 - 600}
+    rpc.getnetworkhashps.return_value = 100.0
+    blk = {
+        'height': 10,
+        'time': 1_600_000_000,
+        'hash': 'blockhash',
+        'previousblockhash': 'prevhash',
+        'tx': [{'txid': 'txid1', 'vout': [{'value': 50.0}, {'value': 0.25}]}],
+    }
+
+    data = await extract_metrics(rpc, blk, source=METRICS_SOURCES['verbose'])
+
+    rpc.getrawtransaction.assert_not_called()
+    assert data['fees'] == pytest.approx(0.25)
+
+@pytest.mark.asyncio
+async def test_extract_metrics_batch_with_blockstats():
+    blocks = {
+        'h10': {'height': 10, 'time': 1_600_000_000, 'hash': 'h10', 'previousblockhash': 'h9', 'tx': ['a']},
+        'h11': {'height': 11, 'time': 1_600_000_300, 'hash': 'h11', 'previousblockhash': 'h10', 'tx': ['b']},
+    }
+    calls = []
+
+    class FakeBatch:
+        rpc = AsyncMock()
+        async def getblockhashes(self, heights):
+            return [f'h{h}' for h in heights]
+        async def getblocks(self, hashes, verbosity=1):
+            return [blocks[h] for h in hashes]
+        async def batch(self, batch_calls):
+            calls.append(batch_calls)
+            return [
+                {'totalfee': 25_000_000} if method == 'getblockstats' else 100.0
+                for method, _ in batch_calls
+            ]
+
+    batch = FakeBatch()
+    batch.rpc.getblock.return_value = {'time': 1_600_000_000 - 600}
+
+    data = await extract_metrics_batch(batch, range(10, 12), HeaderCache(), METRICS_SOURCES['blockstats'])
+
+    assert [d['height'] for d in data] == [10, 11]
+    assert [d['fees'] for d in data] == [0.25, 0.25]
+    assert [d['time_delta_s'] for d in data] == [600.0, 300.0]
+    assert [method for method, _ in calls[0]] == ['getblockstats', 'getblockstats', 'getnetworkhashps', 'getnetworkhashps']
+
 @pytest.mark.asyncio
 async def test_fetch_price_usd(monkeypatch):
     # Set timestamp to 30 minutes ago
@@ -46,10 +124,13 @@ async def test_fetch_price_usd(monkeypatch):
     data = {'timestamp': ts}
 
     class DummyResp:
+        status_code = 200
         def __init__(self, json_data):
             self._json = json_data
         def json(self):
             return self._json
+        def raise_for_status(self):
+            pass
 
     # Prepare ms in milliseconds to match code expectation
     ms_millis = int(ts.timestamp() * 1000)
@@ -101,3 +182,266 @@ async def test_calculate_revenue_mwh(monkeypatch):
 
     # Should have inserted revenue values
     assert db.execute.call_count >= 2
+
+@pytest.mark.asyncio
+async def test_enrich_price_batch_then_revenue(db_session):
+    from sqlalchemy import insert
+    from uuid import uuid4
+
+    ts = datetime.now(timezone.utc) - timedelta(days=2)
+    await db_session.execute(insert(ASIC).values(
+        id=uuid4(), asic_slug='a', asic_name='A', asic_hash_rate=1_000, asic_power=1_000_000,
+    ))
+    for i, height in enumerate([100, 101]):
+        await db_session.execute(insert(BlockData).values(
+            id=uuid4(), block_number=height, block_timestamp=ts + timedelta(minutes=10 * i),
+            block_subsidy=3.125, block_transaction_fees=0.0, network_hash_rate=1_000.0,
+        ))
+    # 101 has no price point close enough and must stay unpriced
+    prices = AsyncMock()
+    prices.price_at.side_effect = [(50_000.0, ts), (None, None)]
+
+    priced, last_seen = await enrich_price_batch(db_session, prices, 10)
+    assert priced == [100]
+    assert last_seen == 101
+
+    await calculate_revenue_for_heights(db_session, priced)
+    rows = (await db_session.execute(select(MWHRevenue))).scalars().all()
+    assert [(r.block_number, r.mwh_btc_revenue, r.mwh_usd_revenue) for r in rows] == [(100, 3.125 / 2, 3.125 / 2 * 50_000.0)]
+    rates = (await db_session.execute(select(ExchangeRate.block_number))).scalars().all()
+    assert rates == [100]
+
+@pytest.mark.asyncio
+async def test_backfill_chunk_resumes_after_checkpoint(db_session, monkeypatch):
+    from app import tasks
+    from app.models import BackfillChunk
+
+    assert await tasks.plan_backfill(db_session, 100, 109, 4) == [(100, 103), (104, 107), (108, 109)]
+
+    calls = []
+
+    async def fake_ingest(rpc, db, start_height, end_height, checkpoint=None):
+        calls.append((start_height, end_height))
+        # first attempt commits one batch and then dies
+        await checkpoint(start_height + 1)
+        await db.commit()
+        if len(calls) == 1:
+            raise RuntimeError("worker lost")
+
+    monkeypatch.setattr(tasks, "ingest_heights", fake_ingest)
+
+    with pytest.raises(RuntimeError):
+        await tasks.backfill_chunk_range(None, db_session, 100, 103)
+    await tasks.backfill_chunk_range(None, db_session, 100, 103)
+    # a finished chunk is never ingested again
+    await tasks.backfill_chunk_range(None, db_session, 100, 103)
+
+    assert calls == [(100, 103), (102, 103)]
+    chunk = (await db_session.execute(
+        select(BackfillChunk).where(BackfillChunk.start_height == 100)
+    )).scalar_one()
+    assert (chunk.status, chunk.last_height) == ("done", 103)
+    # planning again only returns the chunks that are left
+    assert await tasks.plan_backfill(db_session, 100, 109, 4) == [(104, 107), (108, 109)]
+
+@pytest.mark.asyncio
+async def test_replayed_revenue_is_upserted(db_session):
+    from sqlalchemy import insert
+    from uuid import uuid4
+
+    ts = datetime.now(timezone.utc)
+    await db_session.execute(insert(ASIC).values(
+        id=uuid4(), asic_slug='a', asic_name='A', asic_hash_rate=1_000, asic_power=1_000_000,
+    ))
+    await db_session.execute(insert(BlockData).values(
+        id=uuid4(), block_number=100, block_timestamp=ts,
+        block_subsidy=3.125, block_transaction_fees=0.0, network_hash_rate=1_000.0,
+    ))
+    await db_session.execute(insert(ExchangeRate).values(
+        id=uuid4(), block_number=100, exchange_rate=50_000.0, exchange_rate_timestamp=ts,
+    ))
+
+    await calculate_revenue_for_heights(db_session, [100])
+    await db_session.execute(ExchangeRate.__table__.update().values(exchange_rate=60_000.0))
+    await calculate_revenue_for_heights(db_session, [100])
+
+    rows = (await db_session.execute(select(MWHRevenue))).scalars().all()
+    assert [(r.block_number, r.mwh_usd_revenue) for r in rows] == [(100, 3.125 / 2 * 60_000.0)]
+
+@pytest.mark.asyncio
+async def test_revenue_catches_up_to_price_checkpoint(db_session):
+    from sqlalchemy import insert
+    from uuid import uuid4
+    from app.crud import get_checkpoint, rewind_checkpoints
+    from app.tasks import advance_price_checkpoint, catch_up_revenue, PRICES_STAGE, REVENUE_STAGE
+
+    ts = datetime.now(timezone.utc)
+    await db_session.execute(insert(ASIC).values(
+        id=uuid4(), asic_slug='a', asic_name='A', asic_hash_rate=1_000, asic_power=1_000_000,
+    ))
+    for height in range(100, 105):
+        await db_session.execute(insert(BlockData).values(
+            id=uuid4(), block_number=height, block_timestamp=ts,
+            block_subsidy=3.125, block_transaction_fees=0.0, network_hash_rate=1_000.0,
+        ))
+        # 103 is still unpriced, the checkpoint can't move past it
+        if height != 103:
+            await db_session.execute(insert(ExchangeRate).values(
+                id=uuid4(), block_number=height, exchange_rate=50_000.0, exchange_rate_timestamp=ts,
+            ))
+    await db_session.commit()
+
+    assert await advance_price_checkpoint(db_session) == 102
+    assert await catch_up_revenue(db_session, 2) == 102
+    assert await get_checkpoint(db_session, REVENUE_STAGE) == 102
+    heights = (await db_session.execute(select(MWHRevenue.block_number))).scalars().all()
+    assert sorted(heights) == [100, 101, 102]
+
+    # a backfill storing blocks below the checkpoints sends both stages back
+    await rewind_checkpoints(db_session, [PRICES_STAGE, REVENUE_STAGE], 100)
+    assert await get_checkpoint(db_session, PRICES_STAGE) == 100
+    assert await get_checkpoint(db_session, REVENUE_STAGE) == 100
+
+@pytest.mark.asyncio
+async def test_reorg_rolls_back_only_orphaned_heights(db_session, monkeypatch):
+    from sqlalchemy import insert
+    from uuid import uuid4
+    from app import tasks
+    from app.crud import get_checkpoint, set_checkpoint
+
+    ts = datetime.now(timezone.utc)
+    asic_id = uuid4()
+    await db_session.execute(insert(ASIC).values(
+        id=asic_id, asic_slug='a', asic_name='A', asic_hash_rate=1_000, asic_power=1_000_000,
+    ))
+    for height in range(90, 105):
+        await db_session.execute(insert(BlockData).values(
+            id=uuid4(), block_number=height, block_timestamp=ts, block_hash=f"h{height}",
+            block_subsidy=3.125, block_transaction_fees=0.0, network_hash_rate=1_000.0,
+        ))
+        await db_session.execute(insert(ExchangeRate).values(
+            id=uuid4(), block_number=height, exchange_rate=50_000.0, exchange_rate_timestamp=ts,
+        ))
+        await db_session.execute(insert(MWHRevenue).values(
+            id=uuid4(), asic_id=asic_id, block_number=height, mwh_revenue_timestamp=ts,
+            mwh_btc_revenue=1.0, mwh_usd_revenue=1.0,
+        ))
+    await set_checkpoint(db_session, tasks.BLOCKS_STAGE, 104)
+    await set_checkpoint(db_session, tasks.REVENUE_STAGE, 104)
+    await db_session.commit()
+
+    # the node replaced 102-104 and has one more block on top
+    node = {h: f"h{h}" for h in range(0, 102)} | {h: f"x{h}" for h in range(102, 106)}
+    rpc = AsyncMock()
+    rpc.getblockcount.return_value = 105
+    rpc.getblockhash.side_effect = lambda h: node[h]
+
+    class FakeBatch:
+        def __init__(self, rpc):
+            self.requested = []
+
+        async def getblockhashes(self, heights):
+            heights = list(heights)
+            self.requested.extend(heights)
+            return [node[h] for h in heights]
+
+    ingested = []
+
+    async def fake_ingest(rpc, db, start_height, end_height, checkpoint=None, headers=None, window=None):
+        ingested.append((start_height, end_height))
+
+    monkeypatch.setattr(tasks, "BatchRPC", FakeBatch)
+    monkeypatch.setattr(tasks, "ingest_heights", fake_ingest)
+
+    assert await tasks.ingest_to_tip(rpc, db_session)
+    assert ingested == [(102, 105)]
+    for model in (BlockData, ExchangeRate, MWHRevenue):
+        heights = (await db_session.execute(select(model.block_number))).scalars().all()
+        assert max(heights) == 101 and len(heights) == 12
+    assert await get_checkpoint(db_session, tasks.BLOCKS_STAGE) == 101
+    assert await get_checkpoint(db_session, tasks.REVENUE_STAGE) == 101
+
+@pytest.mark.asyncio
+async def test_block_not_extending_stored_chain_is_not_written(db_session, monkeypatch):
+    from sqlalchemy import insert
+    from uuid import uuid4
+    from app import tasks
+
+    await db_session.execute(insert(BlockData).values(
+        id=uuid4(), block_number=99, block_timestamp=datetime.now(timezone.utc), block_hash="h99",
+        block_subsidy=3.125, block_transaction_fees=0.0, network_hash_rate=1_000.0,
+    ))
+    await db_session.commit()
+
+    blk = {'height': 100, 'time': 1_600_000_000, 'hash': 'h100', 'previousblockhash': 'other', 'tx': ['cb']}
+    rpc = AsyncMock()
+    rpc.getblockhash.return_value = 'h100'
+    rpc.getblock.return_value = blk
+    monkeypatch.setattr(tasks, "BATCH_SIZE", 1)
+    monkeypatch.setattr(tasks, "CONCURRENCY", 1)
+    monkeypatch.setattr(tasks, "LOCAL_HASHRATE", False)
+    monkeypatch.setattr(tasks, "extract_metrics", AsyncMock(return_value=tasks.build_metrics(blk, blk, 0.0, 1.0)))
+
+    with pytest.raises(tasks.ReorgDetected):
+        await tasks.ingest_heights(rpc, db_session, 100, 100)
+    heights = (await db_session.execute(select(BlockData.block_number))).scalars().all()
+    assert heights == [99]
+
+@pytest.mark.asyncio
+async def test_node_behind_on_same_chain_keeps_stored_blocks(db_session, monkeypatch):
+    from sqlalchemy import insert
+    from uuid import uuid4
+    from app import tasks
+    from app.crud import get_checkpoint, set_checkpoint
+
+    ts = datetime.now(timezone.utc)
+    for height in range(90, 105):
+        await db_session.execute(insert(BlockData).values(
+            id=uuid4(), block_number=height, block_timestamp=ts, block_hash=f"h{height}",
+            block_subsidy=3.125, block_transaction_fees=0.0, network_hash_rate=1_000.0,
+        ))
+        await db_session.execute(insert(ExchangeRate).values(
+            id=uuid4(), block_number=height, exchange_rate=50_000.0, exchange_rate_timestamp=ts,
+        ))
+    await set_checkpoint(db_session, tasks.BLOCKS_STAGE, 104)
+    await db_session.commit()
+
+    # e.g. a node restarted with -reindex, it's at 97 on the chain we stored
+    rpc = AsyncMock()
+    rpc.getblockcount.return_value = 97
+    rpc.getblockhash.side_effect = lambda h: f"h{h}"
+    ingest = AsyncMock()
+    monkeypatch.setattr(tasks, "ingest_heights", ingest)
+
+    assert await tasks.ingest_to_tip(rpc, db_session) is False
+    ingest.assert_not_called()
+    rpc.getblockhash.assert_called_once_with(97)
+    for model in (BlockData, ExchangeRate):
+        heights = (await db_session.execute(select(model.block_number))).scalars().all()
+        assert len(heights) == 15 and max(heights) == 104
+    assert await get_checkpoint(db_session, tasks.BLOCKS_STAGE) == 104
+
+@pytest.mark.asyncio
+async def test_prices_requested_per_price_batch(db_session, monkeypatch):
+    from app import tasks
+
+    requests = []
+
+    async def fake_request():
+        requests.append(len((await db_session.execute(select(BlockData.block_number))).scalars().all()))
+
+    async def records():
+        for height in range(100, 125):
+            yield {
+                "height": height, "timestamp": datetime.now(timezone.utc), "subsidy": 3.125, "fees": 0.0,
+                "hashrate": 1.0, "difficulty": 1.0, "chainwork": None, "hash": f"h{height}",
+                "prevhash": f"h{height - 1}",
+            }
+
+    monkeypatch.setattr(tasks, "request_price_enrichment", fake_request)
+    monkeypatch.setattr(tasks, "WRITE_BATCH_SIZE", 4)
+    monkeypatch.setattr(tasks, "PRICE_BATCH_SIZE", 10)
+    await tasks.store_metrics(db_session, records(), 100)
+
+    # every 10 blocks, not on every 4 block flush, plus once for the remainder
+    assert requests == [12, 24, 25]
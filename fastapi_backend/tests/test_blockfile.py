@@ -0,0 +1,106 @@
+import struct
+
+import pytest
+
+from app.blockfile import NETWORK_MAGIC, NULL_HASH, BlockIndex, sha256d
+from app.tasks import blockfile_metrics
+
+REGTEST_BITS = 0x207FFFFF
+
+
+def coinbase_tx(value_sats, segwit=False):
+    script = b"\x01\x01"
+    tx = struct.pack("<i", 1)
+    if segwit:
+        tx += b"\x00\x01"
+    tx += b"\x01" + NULL_HASH + b"\xff\xff\xff\xff" + bytes([len(script)]) + script + b"\xff\xff\xff\xff"
+    # two outputs, the second one carrying 1000 sats
+    tx += b"\x02" + struct.pack("<q", value_sats - 1000) + b"\x01\x51" + struct.pack("<q", 1000) + b"\x01\x51"
+    if segwit:
+        tx += b"\x01\x20" + bytes(32)
+    return tx + struct.pack("<I", 0)
+
+
+def make_block(prev, time, value_sats, segwit=False):
+    header = struct.pack("<i", 0x20000000) + prev + bytes(32) + struct.pack("<III", time, REGTEST_BITS, 0)
+    return sha256d(header), header + b"\x01" + coinbase_tx(value_sats, segwit)
+
+
+def write_blockfile(path, blocks, key=None):
+    data = b"".join(NETWORK_MAGIC["regtest"] + struct.pack("<I", len(b)) + b for b in blocks)
+    # preallocated, zero-filled tail like bitcoind leaves it
+    data += bytes(64)
+    if key is not None:
+        data = bytes(b ^ key[i % len(key)] for i, b in enumerate(data))
+    path.write_bytes(data)
+
+
+@pytest.fixture(params=[None, bytes.fromhex("0102030405060708")], ids=["plain", "xor"])
+def blocks_dir(tmp_path, request):
+    key = request.param
+    if key is not None:
+        (tmp_path / "xor.dat").write_bytes(key)
+
+    h0, b0 = make_block(NULL_HASH, 1000, 50 * 10**8)
+    h1, b1 = make_block(h0, 1600, 50 * 10**8 + 25_000, segwit=True)
+    h2, b2 = make_block(h1, 2200, 50 * 10**8 + 50_000)
+    h3, b3 = make_block(h2, 2800, 50 * 10**8 + 75_000, segwit=True)
+    # a stale block at height 2, it loses to the longer branch
+    _, stale = make_block(h1, 2300, 50 * 10**8)
+
+    # headers-first download stores blocks out of order and across files
+    write_blockfile(tmp_path / "blk00000.dat", [b0, b1, b3], key)
+    write_blockfile(tmp_path / "blk00001.dat", [stale, b2], key)
+    return tmp_path, [h0, h1, h2, h3]
+
+
+def test_index_follows_the_most_work_chain(blocks_dir):
+    path, hashes = blocks_dir
+    index = BlockIndex(path, "regtest").scan()
+    try:
+        assert index.tip_height == 3
+        headers = list(index.headers(0, 3))
+        assert [h["hash"] for h in headers] == [h[::-1].hex() for h in hashes]
+        assert headers[0]["previousblockhash"] is None
+        assert headers[2]["previousblockhash"] == headers[1]["hash"]
+        # regtest blocks each add 2 to chainwork
+        assert [int(h["chainwork"], 16) for h in headers] == [2, 4, 6, 8]
+        assert headers[3]["difficulty"] == pytest.approx(4.656542373906925e-10)
+        assert [index.coinbase_sats(h) for h in range(4)] == [
+            50 * 10**8, 50 * 10**8 + 25_000, 50 * 10**8 + 50_000, 50 * 10**8 + 75_000,
+        ]
+    finally:
+        index.close()
+
+
+def test_index_keeps_only_a_few_files_open(blocks_dir):
+    path, _ = blocks_dir
+    index = BlockIndex(path, "regtest", open_files=1).scan()
+    try:
+        # the scan closes every file it read
+        assert not index._files
+        # heights 1, 2, 3 alternate between blk00000 and blk00001, each read evicts the other file
+        assert [index.coinbase_sats(h) for h in (1, 2, 3)] == [
+            50 * 10**8 + 25_000, 50 * 10**8 + 50_000, 50 * 10**8 + 75_000,
+        ]
+        assert list(index._files) == [0]
+    finally:
+        index.close()
+
+
+@pytest.mark.asyncio
+async def test_blockfile_metrics(blocks_dir):
+    path, _ = blocks_dir
+    index = BlockIndex(path, "regtest").scan()
+    try:
+        records = [rec async for rec in blockfile_metrics(index, 2, 3)]
+    finally:
+        index.close()
+
+    assert [r["height"] for r in records] == [2, 3]
+    assert records[0]["fees"] == pytest.approx(0.0005)
+    assert records[1]["fees"] == pytest.approx(0.00075)
+    assert records[1]["prevhash"] == records[0]["hash"]
+    assert records[0]["time_delta_s"] == 600
+    # work since the window start over the time spread, what getnetworkhashps(-1) would say
+    assert records[1]["hashrate"] == pytest.approx((8 - 2) / 1800)
@@ -0,0 +1,61 @@
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app import daemon
+
+
+@pytest.mark.asyncio
+async def test_daemon_reuses_caches_and_catches_up_per_block(monkeypatch):
+    passes = []
+    # first catch-up ingests twice, then one pass per notification finds a block
+    results = iter([True, True, False, True, False, False])
+
+    async def fake_ingest_to_tip(rpc, db, headers, window):
+        passes.append((headers, window))
+        return next(results)
+
+    @asynccontextmanager
+    async def sessions():
+        yield object()
+
+    async def notifications():
+        yield "hash-1"
+        yield "hash-2"
+
+    monkeypatch.setattr(daemon, "ingest_to_tip", fake_ingest_to_tip)
+    await daemon.IngestionDaemon(object(), sessions).run(notifications())
+
+    assert len(passes) == 6
+    # the same header cache and hashrate window are carried across every pass
+    assert len({(id(h), id(w)) for h, w in passes}) == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_pass_is_retried_with_backoff(monkeypatch):
+    # a node restart, then the node is back with one new block
+    results = iter([ConnectionError("node restarting"), TimeoutError(), True, False])
+    sessions_opened = []
+
+    async def fake_ingest_to_tip(rpc, db, headers, window):
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    @asynccontextmanager
+    async def sessions():
+        sessions_opened.append(object())
+        yield sessions_opened[-1]
+
+    sleeps = []
+
+    async def fake_sleep(delay):
+        sleeps.append(delay)
+
+    monkeypatch.setattr(daemon, "ingest_to_tip", fake_ingest_to_tip)
+    monkeypatch.setattr(daemon.asyncio, "sleep", fake_sleep)
+    await daemon.IngestionDaemon(object(), sessions).catch_up()
+
+    assert sleeps == [daemon.RETRY_DELAY, daemon.RETRY_DELAY * 2]
+    assert len(sessions_opened) == 4
@@ -91,3 +91,43 @@ async def test_session_maker_configuration():
     # Create a test session
     async with async_session_maker() as session:
         assert isinstance(session, AsyncSession)
+
+
+def test_pool_options(mocker):
+    from sqlalchemy import NullPool
+    from app.database import pool_options
+
+    assert pool_options("null") == {"poolclass": NullPool}
+
+    mock_settings = mocker.patch("app.database.settings")
+    mock_settings.DB_POOL_SIZE = 20
+    mock_settings.DB_MAX_OVERFLOW = 5
+    mock_settings.DB_POOL_TIMEOUT = 10.0
+    mock_settings.DB_POOL_RECYCLE = 600
+    mock_settings.DB_POOL_PRE_PING = True
+    assert pool_options("queue") == {
+        "pool_size": 20,
+        "max_overflow": 5,
+        "pool_timeout": 10.0,
+        "pool_recycle": 600,
+        "pool_pre_ping": True,
+    }
+
+    with pytest.raises(ValueError):
+        pool_options("static")
+
+
+def test_pool_stats_for_queue_pool(mocker):
+    from sqlalchemy import AsyncAdaptedQueuePool
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from app.database import pool_stats
+
+    queue_engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:", poolclass=AsyncAdaptedQueuePool, pool_size=3, max_overflow=2,
+    )
+    mocker.patch("app.database.engine", queue_engine)
+
+    stats = pool_stats()
+    assert stats["mode"] == "queue"
+    assert stats["size"] == 3
+    assert stats["checked_out"] == 0
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from app.downsample import lttb
+
+
+def reference_lttb(x, y, max_points):
+    # the textbook loop from Steinarsson's thesis, one point at a time
+    n = len(x)
+    every = (n - 2) / (max_points - 2)
+    selected, a = [0], 0
+    for i in range(max_points - 2):
+        lo, hi = int(i * every) + 1, int((i + 1) * every) + 1
+        nxt_lo, nxt_hi = hi, min(int((i + 2) * every) + 1, n)
+        if i == max_points - 3:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        else:
+            avg_x = sum(x[nxt_lo:nxt_hi]) / (nxt_hi - nxt_lo)
+            avg_y = sum(y[nxt_lo:nxt_hi]) / (nxt_hi - nxt_lo)
+        best, best_area = lo, -1.0
+        for j in range(lo, hi):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    return selected + [n - 1]
+
+
+@pytest.mark.parametrize("n, max_points", [(1000, 50), (997, 100), (50, 49), (10, 3)])
+def test_lttb_matches_reference(n, max_points):
+    rng = np.random.default_rng(3)
+    x = np.cumsum(rng.integers(300, 900, n)).astype(float)
+    y = rng.normal(size=n).cumsum()
+    assert lttb(x, y, max_points).tolist() == reference_lttb(x.tolist(), y.tolist(), max_points)
+
+
+def test_lttb_keeps_extremes():
+    x = np.arange(10_000, dtype=float)
+    y = np.sin(x / 500)
+    y[1234], y[8765] = 25.0, -25.0
+
+    selected = lttb(x, y, 200)
+    assert len(selected) == 200
+    assert selected[0] == 0 and selected[-1] == 9_999
+    assert 1234 in selected and 8765 in selected
+    assert np.all(np.diff(selected) > 0)
+
+
+def test_lttb_short_series_untouched():
+    assert lttb([1, 2, 3], [1, 5, 2], 10).tolist() == [0, 1, 2]
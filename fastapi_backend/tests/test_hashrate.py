@@ -0,0 +1,48 @@
+import random
+
+import pytest
+
+from app.hashrate import HashrateWindow, lookup_for
+
+
+def reference_hashps(headers, height, nblocks):
+    # straight port of bitcoind's GetNetworkHashPS over a list indexed by height
+    lookup = lookup_for(height, nblocks)
+    window = headers[height - lookup:height + 1]
+    times = [t for t, _ in window]
+    if max(times) == min(times):
+        return 0.0
+    return (window[-1][1] - window[0][1]) / (max(times) - min(times))
+
+
+def make_chain(length):
+    rng = random.Random(7)
+    headers, time, work = [], 1_600_000_000, 0
+    for _ in range(length):
+        # block times are not monotonic on mainnet, include some out-of-order ones
+        time += rng.randint(-300, 1500)
+        work += rng.randint(10**12, 2 * 10**12)
+        headers.append((time, work))
+    return headers
+
+
+@pytest.mark.parametrize("nblocks", [-1, 120, 7])
+def test_window_matches_getnetworkhashps(nblocks):
+    headers = make_chain(4500)
+    window = HashrateWindow(nblocks)
+
+    for height, (time, work) in enumerate(headers):
+        window.push(height, time, hex(work))
+        if height == 0:
+            continue
+        assert window.hashps() == pytest.approx(reference_hashps(headers, height, nblocks))
+
+
+def test_window_needs_full_lookback():
+    window = HashrateWindow(120)
+    window.push(1000, 1_600_000_000, "0x10")
+    assert window.hashps() is None
+
+    # a gap resets the window
+    window.push(1002, 1_600_000_600, "0x20")
+    assert len(window) == 1
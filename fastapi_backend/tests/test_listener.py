@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+import zmq
+import zmq.asyncio
+
+from app import listener
+from app.listener import HASHBLOCK_TOPIC, listen, longpoll_block_hashes, zmq_block_hashes
+
+
+class FakeNode:
+    def __init__(self, tips):
+        self._tips = iter(tips)
+        self.calls = []
+
+    async def acall(self, method, params, **kwargs):
+        self.calls.append((method, params))
+        try:
+            tip = next(self._tips)
+        except StopIteration:
+            raise asyncio.CancelledError
+        if isinstance(tip, Exception):
+            raise tip
+        return {"hash": tip, "height": 0}
+
+
+@pytest.mark.asyncio
+async def test_longpoll_yields_only_new_tips():
+    # the first answer is the tip we start from, a timed out poll repeats the same tip
+    node = FakeNode(["a", "a", "b", "b", "c"])
+    seen = []
+
+    async def on_block(blockhash):
+        seen.append(blockhash)
+
+    with pytest.raises(asyncio.CancelledError):
+        await listen(longpoll_block_hashes(node, timeout_ms=1000), on_block)
+
+    assert seen == ["b", "c"]
+    assert node.calls[0] == ("waitfornewblock", [1000])
+
+
+@pytest.mark.asyncio
+async def test_longpoll_survives_node_errors(monkeypatch):
+    # a node restart between "a" and "b": the failed polls back off and "b" is still reported
+    node = FakeNode(["a", ConnectionError("node restarting"), TimeoutError(), "b"])
+    sleeps = []
+
+    async def fake_sleep(delay):
+        sleeps.append(delay)
+
+    monkeypatch.setattr(listener.asyncio, "sleep", fake_sleep)
+    seen = []
+
+    async def on_block(blockhash):
+        seen.append(blockhash)
+
+    with pytest.raises(asyncio.CancelledError):
+        await listen(longpoll_block_hashes(node, timeout_ms=1000), on_block)
+
+    assert seen == ["b"]
+    assert sleeps == [listener.RETRY_DELAY, listener.RETRY_DELAY * 2]
+
+
+@pytest.mark.asyncio
+async def test_listen_keeps_going_when_a_trigger_fails():
+    node = FakeNode(["a", "b", "c"])
+    seen = []
+
+    async def on_block(blockhash):
+        seen.append(blockhash)
+        if blockhash == "b":
+            raise ConnectionError("broker down")
+
+    with pytest.raises(asyncio.CancelledError):
+        await listen(longpoll_block_hashes(node, timeout_ms=1000), on_block)
+
+    assert seen == ["b", "c"]
+
+
+@pytest.mark.asyncio
+async def test_zmq_listener_with_local_publisher():
+    ctx = zmq.asyncio.Context()
+    pub = ctx.socket(zmq.PUB)
+    port = pub.bind_to_random_port("tcp://127.0.0.1")
+    hashes = zmq_block_hashes(f"tcp://127.0.0.1:{port}", context=ctx)
+    first = asyncio.ensure_future(hashes.__anext__())
+
+    # SUB sockets join late, publish until the subscription is in place
+    blockhash = bytes(range(32))
+    while not first.done():
+        await pub.send_multipart([HASHBLOCK_TOPIC, blockhash, (0).to_bytes(4, "little")])
+        await asyncio.sleep(0.01)
+
+    assert first.result() == blockhash.hex()
+    await hashes.aclose()
+    pub.close(linger=0)
+    ctx.term()
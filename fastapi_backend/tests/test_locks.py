@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+
+from app.locks import LeaseLock, PendingFlag
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa", reason="renew and release are Lua scripts, fakeredis needs lupa to run them")
+
+
+@pytest.fixture
+def client():
+    # a real Redis stand-in: SET NX PX, key expiry and the lock scripts all run as on the server
+    return fakeredis.aioredis.FakeRedis(decode_responses=True)
+
+
+@pytest.mark.asyncio
+async def test_second_holder_is_turned_away(client):
+    first, second = LeaseLock(client, "lock:test"), LeaseLock(client, "lock:test")
+
+    async with first.held() as acquired:
+        assert acquired
+        async with second.held() as duplicate:
+            assert not duplicate
+    assert not await client.exists("lock:test")
+
+    async with second.held() as acquired:
+        assert acquired
+
+
+@pytest.mark.asyncio
+async def test_lease_expires_and_is_renewed(client):
+    crashed, waiting = LeaseLock(client, "lock:test", ttl=0.1), LeaseLock(client, "lock:test", ttl=0.1)
+
+    # a worker that dies without releasing holds the lock for `ttl` at most
+    assert await crashed.acquire()
+    assert 0 < await client.pttl("lock:test") <= 100
+    assert not await waiting.acquire()
+    await asyncio.sleep(0.15)
+    assert await waiting.acquire()
+
+    # renewing extends only the holder's own lease
+    await asyncio.sleep(0.05)
+    assert not await crashed.renew()
+    assert await waiting.renew()
+    assert await client.pttl("lock:test") > 60
+
+
+@pytest.mark.asyncio
+async def test_holder_is_cancelled_when_the_lease_is_lost(client):
+    lock = LeaseLock(client, "lock:test", ttl=0.03)
+
+    async def run():
+        async with lock.held():
+            # another worker took over after our lease expired
+            await client.set("lock:test", "someone else")
+            await asyncio.sleep(1)
+
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.ensure_future(run())
+    # the old holder's release leaves the new owner's lease alone
+    assert await client.get("lock:test") == "someone else"
+
+
+@pytest.mark.asyncio
+async def test_holder_is_cancelled_when_renewals_keep_failing(client, monkeypatch):
+    lock = LeaseLock(client, "lock:test", ttl=0.06)
+    attempts = []
+
+    async def unreachable():
+        attempts.append(asyncio.get_running_loop().time())
+        raise ConnectionError("redis went away")
+
+    monkeypatch.setattr(lock, "renew", unreachable)
+
+    async def run():
+        async with lock.held():
+            await asyncio.sleep(1)
+
+    started = asyncio.get_running_loop().time()
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.ensure_future(run())
+    # retried, then gave up before the lease could be taken by someone else
+    assert len(attempts) > 1
+    assert asyncio.get_running_loop().time() - started < 0.06 + 0.05
+
+
+@pytest.mark.asyncio
+async def test_holder_survives_a_transient_renew_error(client, monkeypatch):
+    lock = LeaseLock(client, "lock:test", ttl=0.06)
+    renew = lock.renew
+    failures = [ConnectionError("blip")]
+
+    async def flaky():
+        if failures:
+            raise failures.pop()
+        return await renew()
+
+    monkeypatch.setattr(lock, "renew", flaky)
+
+    async with lock.held() as acquired:
+        assert acquired
+        await asyncio.sleep(0.15)
+    assert not failures
+    assert not await client.exists("lock:test")
+
+
+@pytest.mark.asyncio
+async def test_pending_flag_lets_one_run_queue(client):
+    producer, task = PendingFlag(client, "pending:test", 60), PendingFlag(client, "pending:test", 60)
+
+    assert await producer.set()
+    # a run is already queued, the next writers don't add another
+    assert not await producer.set()
+    # once it starts, newer writes queue a fresh run
+    await task.clear()
+    assert await producer.set()
+
+
+@pytest.mark.asyncio
+async def test_pending_flag_expires(client):
+    # a lost message doesn't block later enqueues for longer than the flag's ttl
+    flag = PendingFlag(client, "pending:test", 0.05)
+    assert await flag.set()
+    assert not await flag.set()
+    await asyncio.sleep(0.1)
+    assert await flag.set()
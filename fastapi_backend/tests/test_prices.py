@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, Mock
+
+import httpx
+import pytest
+
+from app.http_client import make_price_client
+from app.prices import PriceCache, PriceSeries, fetch_price_range
+
+
+def test_price_series_nearest():
+    series = PriceSeries([(300, 3.0), (100, 1.0), (200, 2.0)])
+
+    assert series.nearest(90) == (100, 1.0)
+    assert series.nearest(240) == (200, 2.0)
+    assert series.nearest(260) == (300, 3.0)
+    assert series.nearest(10_000) == (300, 3.0)
+    assert PriceSeries().nearest(100) is None
+
+
+@pytest.mark.asyncio
+async def test_price_cache_fetches_wide_range_once(db_session):
+    start = datetime.now(timezone.utc) - timedelta(days=30)
+    # hourly points covering the next 10 days
+    hourly = [[int((start + timedelta(hours=i)).timestamp() * 1000), 1000.0 + i] for i in range(240)]
+    fetch = AsyncMock(return_value=hourly)
+
+    prices = PriceCache(db_session, fetch=fetch)
+    for minutes in range(0, 24 * 60, 10):
+        price, _ = await prices.price_at(start + timedelta(minutes=minutes))
+        assert price is not None
+    assert fetch.await_count == 1
+
+    # a fresh cache on the same database never hits the provider
+    fresh_fetch = AsyncMock(return_value=[])
+    price, price_ts = await PriceCache(db_session, fetch=fresh_fetch).price_at(start + timedelta(hours=5, minutes=10))
+    assert price == 1005.0
+    assert price_ts == datetime.fromtimestamp(hourly[5][0] / 1000, tz=timezone.utc)
+    fresh_fetch.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_price_cache_records_ranges_without_points(db_session):
+    # early history: the provider answers, but with nothing near these blocks
+    start = datetime.now(timezone.utc) - timedelta(days=400)
+    fetch = AsyncMock(return_value=[])
+
+    prices = PriceCache(db_session, fetch=fetch)
+    for days in range(0, 30, 3):
+        assert await prices.price_at(start + timedelta(days=days)) == (None, None)
+    assert fetch.await_count == 1
+
+    # the fetched range is persisted, another run over the same gap stays offline
+    fresh_fetch = AsyncMock(return_value=[])
+    assert await PriceCache(db_session, fetch=fresh_fetch).price_at(start + timedelta(days=10)) == (None, None)
+    fresh_fetch.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_price_cache_refetches_unsettled_ranges(db_session):
+    # points for the last hour may still arrive, a recent miss isn't recorded as covered
+    fetch = AsyncMock(return_value=[])
+    prices = PriceCache(db_session, fetch=fetch)
+    recent = datetime.now(timezone.utc) - timedelta(minutes=10)
+
+    await prices.price_at(recent)
+    await prices.price_at(recent)
+    assert fetch.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_fetch_price_range_honours_retry_after(monkeypatch):
+    request = httpx.Request("GET", "https://api.coingecko.com")
+    responses = [
+        httpx.Response(429, headers={"Retry-After": "7"}, request=request),
+        httpx.Response(200, json={"prices": [[1_000, 1.0]]}, request=request),
+    ]
+
+    async def fake_get(self, url):
+        return responses.pop(0)
+
+    monkeypatch.setattr(httpx.AsyncClient, "get", fake_get)
+    limiter = AsyncMock()
+
+    prices = await fetch_price_range(0, 10, limiter)
+
+    assert prices == [[1_000, 1.0]]
+    assert limiter.acquire.await_count == 2
+    limiter.block_for.assert_awaited_once_with(7.0)
+
+
+@pytest.mark.asyncio
+async def test_fetch_price_range_uses_injected_client(monkeypatch):
+    seen = []
+
+    def handler(request):
+        seen.append(request.url)
+        if len(seen) == 1:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"prices": [[2_000, 2.0]]})
+
+    monkeypatch.setattr("app.prices.asyncio.sleep", AsyncMock())
+    # a given transport replaces the pooled default, which then isn't built at all
+    default_transport = Mock(side_effect=AssertionError("default transport built"))
+    monkeypatch.setattr(httpx, "AsyncHTTPTransport", default_transport)
+    async with make_price_client(transport=httpx.MockTransport(handler), base_url="http://prices.local") as client:
+        prices = await fetch_price_range(100, 200, client=client)
+
+    assert prices == [[2_000, 2.0]]
+    # the 503 was retried on the same client
+    assert len(seen) == 2
+    assert seen[-1].host == "prices.local"
+    assert seen[-1].params["from"] == "100"
+    default_transport.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_price_client_pool_settings():
+    from app.http_client import HTTP2_AVAILABLE
+
+    async with make_price_client() as client:
+        pool = client._transport._pool
+        assert pool._max_connections == 10
+        assert pool._max_keepalive_connections == 5
+        assert pool._keepalive_expiry == 60
+        assert pool._http2 == HTTP2_AVAILABLE
@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from app.ratelimit import TokenBucket
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa", reason="the bucket is a Lua script, fakeredis needs lupa to run it")
+
+
+@pytest.fixture
+def buckets():
+    # two workers: separate clients on one shared server, 10 tokens per second with a burst of 2
+    server = fakeredis.FakeServer()
+    clients = [fakeredis.aioredis.FakeRedis(server=server) for _ in range(2)]
+    return [TokenBucket(client, "ratelimit:test", rate_per_min=600, capacity=2) for client in clients]
+
+
+async def timed(coro):
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await coro
+    return loop.time() - start
+
+
+@pytest.mark.asyncio
+async def test_burst_then_rate_shared_across_buckets(buckets):
+    first, second = buckets
+
+    # the burst is shared, one token each and the bucket is empty
+    assert await timed(first.acquire()) < 0.05
+    assert await timed(second.acquire()) < 0.05
+
+    # after that both wait for the refill, one token per 100 ms between them
+    elapsed = await timed(asyncio.gather(first.acquire(), second.acquire(), first.acquire()))
+    assert 0.25 <= elapsed < 0.45
+
+
+@pytest.mark.asyncio
+async def test_retry_after_blocks_every_bucket(buckets):
+    first, second = buckets
+
+    await first.block_for(0.3)
+    # a shorter Retry-After from another worker doesn't shorten the pause
+    await second.block_for(0.05)
+
+    # tokens are available, the shared deadline still holds the other worker back
+    elapsed = await timed(second.acquire())
+    assert 0.25 <= elapsed < 0.4
+    # and it's gone afterwards
+    assert await timed(first.acquire()) < 0.05
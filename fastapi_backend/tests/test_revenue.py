@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import insert, select
+
+from app.models import ASIC, BlockData, ExchangeRate, MWHRevenue, MWHRevenueRollup
+from app.revenue import RevenueEngine, recompute_revenue, revenue_from_select
+from app.utils import mwh_revenue
+
+
+def test_engine_matches_scalar_formula():
+    asics = [
+        SimpleNamespace(id="s21", asic_hash_rate=234e12, asic_power=3510),
+        SimpleNamespace(id="s19", asic_hash_rate=151e12, asic_power=3247),
+    ]
+    blocks = [
+        {"height": 900_000, "timestamp": "t0", "subsidy": 3.125, "fees": 0.02, "hashrate": 8e20, "price_usd": 100_000.0},
+        {"height": 900_001, "timestamp": "t1", "subsidy": 3.125, "fees": 0.11, "hashrate": 9e20, "price_usd": 101_000.0},
+    ]
+
+    rows = RevenueEngine(asics).rows(blocks)
+
+    assert [(r["block_number"], r["asic_id"]) for r in rows] == [
+        (900_000, "s21"), (900_000, "s19"), (900_001, "s21"), (900_001, "s19"),
+    ]
+    for row in rows:
+        block = next(b for b in blocks if b["height"] == row["block_number"])
+        asic = next(a for a in asics if a.id == row["asic_id"])
+        btc, usd = mwh_revenue(
+            asic.asic_hash_rate, asic.asic_power, block["hashrate"],
+            block["subsidy"] + block["fees"], block["price_usd"],
+        )
+        assert row["mwh_btc_revenue"] == pytest.approx(btc)
+        assert row["mwh_usd_revenue"] == pytest.approx(usd)
+        assert row["mwh_revenue_timestamp"] == block["timestamp"]
+
+
+def test_engine_without_asics_writes_nothing():
+    assert RevenueEngine([]).rows([{"height": 1, "timestamp": "t", "subsidy": 1, "fees": 0, "hashrate": 1, "price_usd": 1}]) == []
+
+
+async def seed_history(db, heights, unpriced=()):
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    asics = [
+        ASIC(id=uuid4(), asic_slug="s21", asic_name="S21", asic_hash_rate=234e12, asic_power=3510),
+        ASIC(id=uuid4(), asic_slug="s19", asic_name="S19", asic_hash_rate=151e12, asic_power=3247),
+    ]
+    db.add_all(asics)
+    blocks = {}
+    for i, height in enumerate(heights):
+        block = dict(
+            block_number=height, block_timestamp=start + timedelta(minutes=10 * i),
+            block_subsidy=3.125, block_transaction_fees=0.01 * i, network_hash_rate=8e20 + 1e19 * i,
+        )
+        await db.execute(insert(BlockData).values(id=uuid4(), **block))
+        if height not in unpriced:
+            await db.execute(insert(ExchangeRate).values(
+                id=uuid4(), block_number=height, exchange_rate=100_000.0 + i,
+                exchange_rate_timestamp=block["block_timestamp"],
+            ))
+            blocks[height] = (block, 100_000.0 + i)
+    await db.commit()
+    return asics, blocks
+
+
+async def stored_revenue(db, asic_id):
+    result = await db.execute(
+        select(MWHRevenue.block_number, MWHRevenue.mwh_btc_revenue, MWHRevenue.mwh_usd_revenue)
+        .where(MWHRevenue.asic_id == asic_id)
+        .order_by(MWHRevenue.block_number)
+    )
+    return {height: (btc, usd) for height, btc, usd in result.all()}
+
+
+def expected_revenue(asic, blocks):
+    return {
+        height: mwh_revenue(
+            asic.asic_hash_rate, asic.asic_power, block["network_hash_rate"],
+            block["block_subsidy"] + block["block_transaction_fees"], price,
+        )
+        for height, (block, price) in blocks.items()
+    }
+
+
+@pytest.mark.asyncio
+async def test_recompute_fills_and_replaces_one_asic(db_session):
+    heights = list(range(100, 110))
+    (s21, s19), blocks = await seed_history(db_session, heights, unpriced={105})
+    # a stale value, a row for a block that lost its price, and another ASIC's row
+    for asic_id, height, value in [(s21.id, 101, 999.0), (s21.id, 105, 999.0), (s19.id, 101, 999.0)]:
+        await db_session.execute(insert(MWHRevenue).values(
+            id=uuid4(), asic_id=asic_id, block_number=height, mwh_revenue_timestamp=datetime.now(timezone.utc),
+            mwh_btc_revenue=value, mwh_usd_revenue=value,
+        ))
+    await db_session.commit()
+
+    # chunks of 3 don't line up with the range, 100-102, 103-105, 106-108, 109
+    written = await recompute_revenue(db_session, s21.id, chunk_size=3)
+
+    assert written == 9
+    stored = await stored_revenue(db_session, s21.id)
+    expected = expected_revenue(s21, blocks)
+    assert sorted(stored) == sorted(expected) == [h for h in heights if h != 105]
+    for height, (btc, usd) in expected.items():
+        assert stored[height] == (pytest.approx(btc), pytest.approx(usd))
+    # one-ASIC mode leaves the others alone
+    assert await stored_revenue(db_session, s19.id) == {101: (999.0, 999.0)}
+
+
+@pytest.mark.asyncio
+async def test_recompute_all_asics_is_repeatable(db_session):
+    (s21, s19), blocks = await seed_history(db_session, list(range(2014, 2020)))
+
+    assert await recompute_revenue(db_session, chunk_size=4) == 12
+    first = {asic.id: await stored_revenue(db_session, asic.id) for asic in (s21, s19)}
+    assert await recompute_revenue(db_session, chunk_size=4) == 12
+    second = {asic.id: await stored_revenue(db_session, asic.id) for asic in (s21, s19)}
+
+    assert first == second
+    for asic in (s21, s19):
+        expected = expected_revenue(asic, blocks)
+        assert first[asic.id] == {h: (pytest.approx(btc), pytest.approx(usd)) for h, (btc, usd) in expected.items()}
+    # rollups are refreshed with each chunk
+    rollups = (await db_session.execute(
+        select(MWHRevenueRollup).where(MWHRevenueRollup.resolution == "epoch")
+    )).scalars().all()
+    assert sorted((r.bucket, r.block_count) for r in rollups) == [(0, 2), (0, 2), (1, 4), (1, 4)]
+
+
+def test_recompute_fill_upserts_on_postgres():
+    from sqlalchemy.dialects import postgresql
+
+    db = SimpleNamespace(bind=SimpleNamespace(dialect=postgresql.dialect()))
+    sql = str(revenue_from_select(db, asic_id="s21").compile(dialect=postgresql.dialect()))
+
+    assert sql.startswith("INSERT INTO mwh_revenue")
+    assert "gen_random_uuid()" in sql
+    assert "ON CONFLICT (block_number, asic_id) DO UPDATE" in sql
@@ -0,0 +1,141 @@
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import delete, insert, select
+
+from app.models import ASIC, BlockData, BlockDataRollup, ExchangeRate, MWHRevenueRollup
+from app.tasks import calculate_revenue_for_heights
+
+
+async def seed(db, asic_id, heights, start):
+    await db.execute(insert(ASIC).values(
+        id=asic_id, asic_slug="a", asic_name="A", asic_hash_rate=1_000, asic_power=1_000_000,
+    ))
+    for i, height in enumerate(heights):
+        ts = start + timedelta(minutes=20 * i)
+        await db.execute(insert(BlockData).values(
+            id=uuid4(), block_number=height, block_timestamp=ts,
+            block_subsidy=3.125, block_transaction_fees=0.01 * i, network_hash_rate=1_000.0 * (i + 1),
+        ))
+        await db.execute(insert(ExchangeRate).values(
+            id=uuid4(), block_number=height, exchange_rate=100_000.0, exchange_rate_timestamp=ts,
+        ))
+
+
+@pytest.mark.asyncio
+async def test_revenue_writes_refresh_touched_buckets(db_session):
+    asic_id = uuid4()
+    start = datetime(2025, 1, 1, 23, 0, tzinfo=timezone.utc)
+    # 23:00, 23:20, 23:40, then 00:00 and 00:20 of the next day, epoch boundary at 2016
+    heights = [2013, 2014, 2015, 2016, 2017]
+    await seed(db_session, asic_id, heights, start)
+
+    await calculate_revenue_for_heights(db_session, heights[:3])
+    await calculate_revenue_for_heights(db_session, heights[3:])
+    # replaying a batch leaves the aggregates as they were
+    await calculate_revenue_for_heights(db_session, heights[3:])
+
+    revenue = (await db_session.execute(
+        select(MWHRevenueRollup).order_by(MWHRevenueRollup.resolution, MWHRevenueRollup.bucket)
+    )).scalars().all()
+    counts = {}
+    for row in revenue:
+        counts.setdefault(row.resolution, []).append((row.first_block, row.last_block, row.block_count))
+    assert counts == {
+        "day": [(2013, 2015, 3), (2016, 2017, 2)],
+        "epoch": [(2013, 2015, 3), (2016, 2017, 2)],
+        "hour": [(2013, 2015, 3), (2016, 2017, 2)],
+    }
+
+    day = next(r for r in revenue if r.resolution == "day" and r.first_block == 2013)
+    assert day.mwh_btc_revenue_mean == pytest.approx(day.mwh_btc_revenue_sum / 3)
+    # our share of the network is 1 / (i + 2), so the first block pays the most
+    assert day.mwh_btc_revenue_max == pytest.approx(3.125 / 2)
+    assert day.mwh_btc_revenue_min == pytest.approx((3.125 + 0.02) / 4)
+    assert day.mwh_usd_revenue_sum == pytest.approx(day.mwh_btc_revenue_sum * 100_000.0)
+
+    blocks = (await db_session.execute(
+        select(BlockDataRollup).where(BlockDataRollup.resolution == "epoch").order_by(BlockDataRollup.bucket)
+    )).scalars().all()
+    assert [(b.bucket, b.block_count, b.network_hash_rate_min, b.network_hash_rate_max) for b in blocks] == [
+        (0, 3, 1_000.0, 3_000.0), (1, 2, 4_000.0, 5_000.0),
+    ]
+    assert blocks[0].block_transaction_fees_sum == pytest.approx(0.03)
+
+
+@pytest.mark.asyncio
+async def test_read_mwh_revenue_by_resolution(test_client, db_session):
+    asic_id = uuid4()
+    start = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) - timedelta(hours=3)
+    await seed(db_session, asic_id, [100, 101, 102, 103], start)
+    await calculate_revenue_for_heights(db_session, [100, 101, 102, 103])
+
+    response = await test_client.get("/mwh_revenue/", params={
+        "asic_id": str(asic_id),
+        "timestamp_start": (start - timedelta(hours=1)).isoformat(),
+        "timestamp_end": datetime.now(timezone.utc).isoformat(),
+        "resolution": "hour",
+    })
+    assert response.status_code == 200
+    assert [(r["first_block"], r["block_count"]) for r in response.json()] == [(100, 3), (103, 1)]
+
+    response = await test_client.get("/block_data/", params={
+        "block_timestamp_start": (start - timedelta(hours=1)).isoformat(),
+        "block_timestamp_end": datetime.now(timezone.utc).isoformat(),
+        "resolution": "epoch",
+    })
+    assert [r["block_count"] for r in response.json()] == [4]
+
+    response = await test_client.get("/block_data/", params={
+        "block_timestamp_start": start.isoformat(),
+        "block_timestamp_end": datetime.now(timezone.utc).isoformat(),
+        "resolution": "day",
+        "hashrate_window": 10,
+    })
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_out_of_order_timestamps_reach_every_bucket(db_session):
+    from app.rollups import refresh_rollups
+
+    # block times aren't monotonic: the middle height sits in the next hour
+    times = [datetime(2025, 1, 1, 10, 59), datetime(2025, 1, 1, 11, 1), datetime(2025, 1, 1, 10, 58)]
+    for height, ts in zip([100, 101, 102], times):
+        await db_session.execute(insert(BlockData).values(
+            id=uuid4(), block_number=height, block_timestamp=ts.replace(tzinfo=timezone.utc),
+            block_subsidy=3.125, block_transaction_fees=0.0, network_hash_rate=1_000.0,
+        ))
+    await refresh_rollups(db_session, 100, 102)
+
+    hours = (await db_session.execute(
+        select(BlockDataRollup).where(BlockDataRollup.resolution == "hour").order_by(BlockDataRollup.bucket)
+    )).scalars().all()
+    assert [(r.first_block, r.last_block, r.block_count) for r in hours] == [(100, 102, 2), (101, 101, 1)]
+    # the 10:00 bucket spans its earliest and latest block, not its first and last height
+    assert hours[0].bucket_start.replace(tzinfo=None) == times[2]
+    assert hours[0].bucket_end.replace(tzinfo=None) == times[0]
+
+
+@pytest.mark.asyncio
+async def test_buckets_without_revenue_are_deleted(db_session):
+    from app.revenue import recompute_revenue
+
+    asic_id = uuid4()
+    start = datetime(2025, 1, 1, 23, 0, tzinfo=timezone.utc)
+    heights = [2013, 2014, 2015, 2016, 2017]
+    await seed(db_session, asic_id, heights, start)
+    await calculate_revenue_for_heights(db_session, heights)
+
+    # the blocks of the next day lose their price, a recompute drops their revenue
+    await db_session.execute(delete(ExchangeRate).where(ExchangeRate.block_number >= 2016))
+    await recompute_revenue(db_session)
+
+    revenue = (await db_session.execute(select(MWHRevenueRollup))).scalars().all()
+    assert sorted((r.resolution, r.first_block, r.last_block) for r in revenue) == [
+        ("day", 2013, 2015), ("epoch", 2013, 2015), ("hour", 2013, 2015),
+    ]
+    # the blocks themselves are still rolled up
+    blocks = (await db_session.execute(select(BlockDataRollup))).scalars().all()
+    assert len(blocks) == 6
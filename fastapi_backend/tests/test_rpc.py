@@ -0,0 +1,62 @@
+import httpx
+import orjson
+import pytest
+from bitcoinrpc import BitcoinRPC, RPCError
+
+from app.rpc import BatchRPC, HeaderCache
+
+
+def make_rpc(handler):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return BitcoinRPC("http://node:8332", client=client)
+
+
+@pytest.mark.asyncio
+async def test_batch_sends_one_request_and_keeps_order():
+    requests = []
+
+    def handler(request):
+        payload = orjson.loads(request.content)
+        requests.append(payload)
+        # answer out of order, BatchRPC must match results back by id
+        answers = [
+            {"jsonrpc": "2.0", "id": call["id"], "result": f"hash-{call['params'][0]}", "error": None}
+            for call in reversed(payload)
+        ]
+        return httpx.Response(200, content=orjson.dumps(answers))
+
+    async with make_rpc(handler) as rpc:
+        hashes = await BatchRPC(rpc).getblockhashes([10, 11, 12])
+
+    assert hashes == ["hash-10", "hash-11", "hash-12"]
+    assert len(requests) == 1
+    assert [call["method"] for call in requests[0]] == ["getblockhash"] * 3
+
+
+@pytest.mark.asyncio
+async def test_batch_raises_on_entry_error():
+    def handler(request):
+        payload = orjson.loads(request.content)
+        answers = [
+            {"jsonrpc": "2.0", "id": call["id"], "result": None,
+             "error": {"code": -8, "message": "Block height out of range"}}
+            for call in payload
+        ]
+        return httpx.Response(200, content=orjson.dumps(answers))
+
+    async with make_rpc(handler) as rpc:
+        with pytest.raises(RPCError):
+            await BatchRPC(rpc).getblockhashes([10**9])
+
+
+def test_header_cache_evicts_least_recently_used():
+    cache = HeaderCache(maxsize=2)
+    cache.put({"hash": "a", "height": 1, "time": 1, "tx": ["coinbase"]})
+    cache.put({"hash": "b", "height": 2, "time": 2})
+    # touch "a" so "b" is the eviction candidate
+    assert cache.get("a")["height"] == 1
+    cache.put({"hash": "c", "height": 3, "time": 3})
+
+    assert len(cache) == 2
+    assert cache.get(2) is None
+    assert cache.get(1) == {"hash": "a", "height": 1, "time": 1}
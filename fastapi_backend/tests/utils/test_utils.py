@@ -1,5 +1,7 @@
 from fastapi.routing import APIRoute
-from app.utils import simple_generate_unique_route_id, block_subsidy, walk_chain, amap
+import asyncio
+
+from app.utils import simple_generate_unique_route_id, block_subsidy, walk_chain, walk_heights, amap
 import pytest
 
 def test_simple_generate_unique_route_id(mocker):
@@ -49,3 +51,23 @@ async def test_walk_chain_and_amap():
     async for v in mapped:
         squares.append(v)
     assert squares == [1, 4, 9]
+
+
+@pytest.mark.asyncio
+async def test_walk_heights_keeps_order_and_bounds_concurrency():
+    in_flight = 0
+    peak = 0
+
+    async def fetch(height):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        # later heights finish first, output must still be ordered
+        await asyncio.sleep(0.001 * (10 - height))
+        in_flight -= 1
+        return height
+
+    results = [h async for h in walk_heights(1, 9, fetch, 3)]
+
+    assert results == list(range(1, 10))
+    assert peak == 3